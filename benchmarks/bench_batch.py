@@ -0,0 +1,59 @@
+"""
+多进程批处理的吞吐量
+生成一批合成图像，用1..N个进程处理，报告每秒文件数和每秒百万像素数
+用法: python -m benchmarks.bench_batch [--files 48] [--size 2MP]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import SIZES, synthetic_image, make_stage
+from core.batch import run_batch
+from core.imageio import write_image
+from core.operations import *
+from core.pipeline import dump_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=48)
+    parser.add_argument('--size', default='2MP', choices=SIZES.keys())
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    pipeline = dump_pipeline([
+        make_stage(Filter, kind=GAUSSIAN_FILTER, ksize=5),
+        make_stage(Morph, op=OPEN_MORPH_OP, ksize=5),
+        make_stage(Gamma, gamma=0.8),
+        Edge(),
+    ])
+    root = tempfile.mkdtemp(prefix='bench_batch_')
+    try:
+        src_dir = os.path.join(root, 'src')
+        os.makedirs(src_dir)
+        for i in range(args.files):
+            write_image(os.path.join(src_dir, '%04d.png' % i), synthetic_image(*SIZES[args.size], seed=i))
+        names = sorted(os.listdir(src_dir))
+
+        print('%d files, %s, pipeline: %s' % (args.files, args.size, [s['type'] for s in pipeline['stages']]))
+        print('%8s %10s %10s %10s' % ('workers', 'seconds', 'files/s', 'MP/s'))
+        counts = sorted({args.max_workers} | {2 ** k for k in range(8) if 2 ** k <= args.max_workers})
+        for workers in counts:
+            dst_dir = os.path.join(root, 'out%d' % workers)
+            jobs = [(os.path.join(src_dir, n), os.path.join(dst_dir, n)) for n in names]
+            start = time.perf_counter()
+            results = run_batch(pipeline, jobs, workers)
+            elapsed = time.perf_counter() - start
+            failed = [r for r in results if r.status != 'done']
+            if failed:
+                raise RuntimeError('%d files failed: %s' % (len(failed), failed[0].error))
+            megapixels = sum(r.pixels for r in results) / 1e6
+            print('%8d %10.2f %10.2f %10.1f' % (workers, elapsed, len(results) / elapsed, megapixels / elapsed))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+显示转换的耗时：OpenCV图像 -> QImage -> QPixmap
+比较原先先cvtColor转为RGB再构造QImage的方式、直接包装内存的方式(to_qimage)
+和显示实际使用的方式(to_display_image)，分别统计构造QImage和生成QPixmap的耗时，
+并校验各方式显示的像素一致
+用法: python -m benchmarks.bench_display [--size 12MP] [--repeat 5]
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QApplication
+
+from benchmarks.common import SIZES, synthetic_image, best_of
+from custom.graphicsView import to_qimage, to_display_image
+
+# 原先的转换方式：灰度图先复制为连续数组，彩色图先转换为RGB
+COPY_CONVERSIONS = {
+    1: (None, QImage.Format_Grayscale8),
+    3: (cv2.COLOR_BGR2RGB, QImage.Format_RGB888),
+    4: (cv2.COLOR_BGRA2RGBA, QImage.Format_RGBA8888),
+}
+
+
+def copy_qimage(img):
+    code, fmt = COPY_CONVERSIONS[1 if img.ndim == 2 else img.shape[2]]
+    img = np.ascontiguousarray(img) if code is None else cv2.cvtColor(img, code)
+    h, w = img.shape[:2]
+    image = QImage(img, w, h, img.strides[0], fmt)
+    image._buffer = img
+    return image
+
+
+def layouts(img):
+    """各通道数的测试图像，另加一个行不连续的裁剪视图"""
+    bgra = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    h, w = img.shape[:2]
+    yield 'gray', cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    yield 'bgr', img
+    yield 'bgra', bgra
+    yield 'bgr-roi', img[h // 8:h - h // 8, w // 8:w - w // 8]
+    yield 'gray16', cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(np.uint16) << 8
+
+
+def same_pixels(a, b):
+    a = a.convertToFormat(QImage.Format_ARGB32)
+    b = b.convertToFormat(QImage.Format_ARGB32)
+    return a == b
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', default='12MP', choices=SIZES.keys())
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    app = QApplication([])  # QPixmap需要QGuiApplication
+    img = synthetic_image(*SIZES[args.size])
+    methods = [('copy', copy_qimage), ('wrap', to_qimage), ('display', to_display_image)]
+    print('%-8s' % 'layout', ' '.join('%12s %12s' % (name + '-qimage', name + '-pixmap') for name, _ in methods),
+          ' identical')
+    for name, sample in layouts(img):
+        reference = sample if sample.dtype == np.uint8 else (sample >> 8).astype(np.uint8)
+        row = []
+        for _, method in methods:
+            src = reference if method is copy_qimage else sample
+            row.append(best_of(lambda: method(src), args.repeat))
+            row.append(best_of(lambda: QPixmap.fromImage(method(src)), args.repeat))
+        expected = copy_qimage(reference)
+        identical = all(same_pixels(expected, method(sample)) for _, method in methods[1:])
+        print('%-8s' % name, ' '.join('%10.2fms' % (t * 1000) for t in row), ' ', identical)
+    del app
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+逐像素操作合并的正确性与收益
+随机生成由亮度调节、伽马校正、阈值处理、灰度化组成的操作链，
+校验合并后与逐级执行的结果逐像素一致，并比较耗时
+用法: python -m benchmarks.bench_fusion [--size 12MP] [--chains 200]
+"""
+import argparse
+import random
+
+import numpy as np
+
+from benchmarks.common import SIZES, synthetic_image, best_of, make_stage
+from core.fusion import FusedPointwise
+from core.operations import *
+
+
+def random_stage(rng):
+    kind = rng.choice(['light', 'gamma', 'threshold', 'graying'])
+    if kind == 'light':
+        return make_stage(Light, alpha=round(rng.uniform(0, 3), 1), beta=rng.randint(0, 120))
+    if kind == 'gamma':
+        return make_stage(Gamma, gamma=round(rng.uniform(0.1, 3), 1))
+    if kind == 'threshold':
+        return make_stage(Threshold, thresh=rng.randint(0, 255), method=rng.randint(0, 4))
+    return Graying()
+
+
+def run_unfused(img, stages):
+    for stage in stages:
+        img = stage(img)
+    return img
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', default='12MP', choices=SIZES.keys())
+    parser.add_argument('--chains', type=int, default=200, help='校验的随机操作链数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    small = synthetic_image(*SIZES['VGA'])
+    small_roi = small[7:401, 13:555]  # 非连续内存
+    for i in range(args.chains):
+        stages = [random_stage(rng) for _ in range(rng.randint(2, 5))]
+        fused = FusedPointwise(stages)
+        for img in (small, small_roi):
+            if not np.array_equal(fused(img), run_unfused(img, stages)):
+                raise AssertionError('chain %d differs: %s' % (i, [(type(s).__name__, s.get_params()) for s in stages]))
+    print('%d random chains verified identical' % args.chains)
+
+    img = synthetic_image(*SIZES[args.size])
+    chains = {
+        'Light+Gamma': [make_stage(Light, alpha=1.2, beta=10), make_stage(Gamma, gamma=0.8)],
+        'Light+Gamma+Threshold': [make_stage(Light, alpha=1.2, beta=10), make_stage(Gamma, gamma=0.8),
+                                  make_stage(Threshold, thresh=100)],
+        'Graying+Gamma+Threshold': [Graying(), make_stage(Gamma, gamma=1.5), make_stage(Threshold, thresh=90)],
+    }
+    print('image %s %s' % (args.size, img.shape))
+    print('%-26s %10s %10s %8s' % ('chain', 'unfused', 'fused', 'speedup'))
+    for name, stages in chains.items():
+        fused = FusedPointwise(stages)
+        t0 = best_of(lambda: run_unfused(img, stages))
+        t1 = best_of(lambda: fused(img))
+        print('%-26s %8.1fms %8.1fms %7.1fx' % (name, t0 * 1000, t1 * 1000, t0 / t1))
+
+
+if __name__ == '__main__':
+    main()
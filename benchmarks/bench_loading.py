@@ -0,0 +1,85 @@
+"""
+大图像加载的耗时与峰值内存
+每种格式、每种读取方式在独立的子进程中执行一次，统计耗时和峰值RSS相对导入模块后的增量：
+- fromfile: 原先的方式，np.fromfile把整个文件读入内存后解码
+- mapped:   文件映射到内存后解码(core.imageio.read_image)
+- reduced:  按缩小倍数解码用于首次显示(core.imageio.read_reduced)
+用法: python -m benchmarks.bench_loading [--size 50MP] [--formats .jpg .png .bmp .tif] [--side 2048]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import SIZES, synthetic_image
+from core.imageio import read_image, read_reduced
+
+MODES = ('fromfile', 'mapped', 'reduced')
+
+
+def peak_rss():
+    """
+    进程的峰值RSS(字节)
+    Linux上ru_maxrss在exec后保留父进程的峰值，改读/proc/self/status中的VmHWM；
+    其它系统用ru_maxrss，macOS上以字节为单位，其它以KB为单位
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def load(mode, path, side):
+    if mode == 'fromfile':
+        return cv2.imdecode(np.fromfile(path, dtype=np.uint8), -1)
+    if mode == 'mapped':
+        return read_image(path)
+    return read_reduced(path, side)[0]
+
+
+def child(mode, path, side):
+    """子进程：执行一次读取，输出 耗时 峰值RSS增量 图像尺寸"""
+    base = peak_rss()
+    start = time.perf_counter()
+    img = load(mode, path, side)
+    elapsed = time.perf_counter() - start
+    print(elapsed, peak_rss() - base, 'x'.join(map(str, img.shape)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', default='50MP', choices=SIZES.keys())
+    parser.add_argument('--formats', nargs='+', default=['.jpg', '.png', '.bmp', '.tif'])
+    parser.add_argument('--side', type=int, default=2048, help='reduced方式的最小长边')
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.side)
+        return
+    img = synthetic_image(*SIZES[args.size])
+    print('%-6s %-9s %10s %12s  %s' % ('format', 'mode', 'time', 'peak RSS', 'shape'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in args.formats:
+            path = os.path.join(tmp, 'image' + ext)
+            cv2.imwrite(path, img)
+            for mode in MODES:
+                out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_loading', '--side', str(args.side),
+                                      '--child', mode, path], stdout=subprocess.PIPE, check=True,
+                                     universal_newlines=True).stdout.split()
+                print('%-6s %-9s %8.0fms %10.0fMB  %s' % (ext, mode, float(out[0]) * 1000,
+                                                        int(out[1]) / 2 ** 20, out[2]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+启动耗时：多次冷启动主程序，统计模块导入耗时、首次绘制耗时和进程总耗时
+主程序在环境变量STARTUP_TIMING下第一次绘制后输出耗时并退出(见main.StartupTimer)
+--json 把结果追加到文件中，便于跨版本跟踪；--importtime 列出导入最慢的模块
+用法: python -m benchmarks.bench_startup [--runs 5] [--json startup.jsonl] [--importtime]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def launch(extra_args=()):
+    """启动一次主程序，返回(导入耗时, 首次绘制耗时, 进程总耗时, 标准错误输出)"""
+    env = dict(os.environ, STARTUP_TIMING='1')
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + list(extra_args) + ['main.py'], cwd=ROOT, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=120)
+    wall = time.perf_counter() - start
+    match = re.search(r'STARTUP import=([\d.]+) first_paint=([\d.]+)', proc.stdout)
+    if match is None:
+        raise RuntimeError('主程序没有输出启动耗时:\n' + proc.stdout + proc.stderr)
+    return float(match.group(1)), float(match.group(2)), wall, proc.stderr
+
+
+def slowest_imports(stderr, top=15):
+    """解析 -X importtime 的输出，返回累计耗时最长的模块[(微秒, 模块名)]"""
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)', line)
+        if match:
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='追加结果的JSON Lines文件')
+    parser.add_argument('--importtime', action='store_true', help='列出导入最慢的模块')
+    args = parser.parse_args()
+    launch()  # 预热文件系统缓存
+    runs = [launch()[:3] for _ in range(args.runs)]
+    result = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'runs': args.runs,
+        'import': statistics.median(r[0] for r in runs),
+        'first_paint': statistics.median(r[1] for r in runs),
+        'wall': statistics.median(r[2] for r in runs),
+    }
+    print('导入 %(import).3fs  首次绘制 %(first_paint).3fs  进程总耗时 %(wall).3fs (%(runs)d次的中位数)' % result)
+    if args.importtime:
+        for us, name in slowest_imports(launch(['-X', 'importtime'])[3]):
+            print('%8.1fms  %s' % (us / 1000, name))
+    if args.json:
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+全部操作与典型操作链的基准测试
+在合成图像上按尺寸、通道数和关键参数逐项计时，不需要图形界面：
+- 单个操作(core.operations)：滤波类型与核大小、形态学操作与核大小、梯度方法、阈值方法等
+- 端到端操作链：core.pipeline.run_pipeline，分别不分块和分块多线程执行
+- 显示转换：custom.graphicsView.to_display_image 与 QPixmap.fromImage(未安装PyQt5时跳过)
+结果写入JSON文件；指定基线文件时逐项比较，耗时增长超过阈值的项标记为退化，存在退化时返回1
+用法:
+    python -m benchmarks.bench_suite [--sizes VGA 2MP 12MP] [--filter 正则] [-o 结果.json]
+    python -m benchmarks.bench_suite --save-baseline              # 保存为本机基线
+    python -m benchmarks.bench_suite --baseline benchmarks/baseline.json [--threshold 0.15]
+基线与机器相关，应在同一台机器上生成和比较
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import SIZES, synthetic_image, best_of, make_stage
+from core.operations import *
+from core.pipeline import run_pipeline
+from core.tiling import TileExecutor
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def operation_cases():
+    """(名称, 操作, 支持的通道数)"""
+    yield 'Graying', Graying(), (3,)
+    for kind, name in ((MEAN_FILTER, 'mean'), (GAUSSIAN_FILTER, 'gaussian'), (MEDIAN_FILTER, 'median')):
+        for ksize in (3, 9, 21):
+            yield 'Filter[%s,k=%d]' % (name, ksize), make_stage(Filter, kind=kind, ksize=ksize), (1, 3)
+    for op, name in ((ERODE_MORPH_OP, 'erode'), (OPEN_MORPH_OP, 'open'), (GRADIENT_MORPH_OP, 'gradient')):
+        for ksize in (3, 15):
+            yield 'Morph[%s,k=%d]' % (name, ksize), make_stage(Morph, op=op, ksize=ksize), (1, 3)
+    for kind, name in ((SOBEL_GRAD, 'sobel'), (SCHARR_GRAD, 'scharr'), (LAPLACIAN_GRAD, 'laplacian')):
+        yield 'Grad[%s]' % name, make_stage(Grad, kind=kind), (1, 3)
+    yield 'Threshold[binary]', make_stage(Threshold, method=BINARY_THRESH_METHOD), (1, 3)
+    yield 'Threshold[otsu]', make_stage(Threshold, method=OTSU_THRESH_METHOD), (1, 3)
+    yield 'Edge', Edge(), (1, 3)
+    yield 'Equalize', Equalize(), (1, 3)
+    yield 'HoughLine', HoughLine(), (1, 3)
+    yield 'Light', make_stage(Light, alpha=1.3, beta=20), (1, 3)
+    yield 'Gamma', make_stage(Gamma, gamma=0.7), (1, 3)
+    yield 'SaltAndPepper', SaltAndPepper(), (1, 3)
+
+
+def chain_cases():
+    """(名称, 操作链)，均在三通道图像上执行"""
+    yield 'chain[denoise-edge]', [make_stage(Filter, kind=GAUSSIAN_FILTER, ksize=5), Graying(), Edge()]
+    yield 'chain[tone]', [make_stage(Light, alpha=1.2, beta=10), make_stage(Gamma, gamma=0.8),
+                          make_stage(Threshold, thresh=100)]
+    yield 'chain[morph-grad]', [make_stage(Filter, ksize=5), make_stage(Morph, op=CLOSE_MORPH_OP, ksize=7),
+                                make_stage(Grad, kind=SOBEL_GRAD)]
+    yield 'chain[gray-equalize-hough]', [Graying(), Equalize(), make_stage(Filter, kind=MEDIAN_FILTER, ksize=5),
+                                         HoughLine()]
+
+
+def display_cases():
+    """显示转换，未安装PyQt5时为空"""
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtGui import QPixmap
+        from PyQt5.QtWidgets import QApplication
+        from custom.graphicsView import to_display_image
+    except ImportError:
+        return []
+    app = QApplication.instance() or QApplication([])
+    return [('display', lambda img: QPixmap.fromImage(to_display_image(img)), app)]
+
+
+def repeat_for(img, repeat):
+    """大图像减少重复次数，保证总耗时可控"""
+    return max(2, repeat // 3) if img.size > 20e6 else repeat
+
+
+def run(args):
+    pattern = re.compile(args.filter) if args.filter else None
+    selected = lambda case: pattern is None or pattern.search(case)
+    executor = TileExecutor(512, None, 0)
+    results = {}
+
+    def record(case, func, img):
+        if not selected(case):
+            return
+        seconds = best_of(func, repeat_for(img, args.repeat))
+        results[case] = seconds
+        print('%-44s %10.2fms' % (case, seconds * 1000), flush=True)
+
+    displays = display_cases()
+    for size in args.sizes:
+        color = synthetic_image(*SIZES[size], seed=args.seed)
+        images = {3: color, 1: cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)}
+        for name, stage, channels in operation_cases():
+            for c in channels:
+                record('%s/%s/c%d' % (name, size, c), lambda: stage(images[c]), images[c])
+        for name, stages in chain_cases():
+            record('%s/%s' % (name, size), lambda: run_pipeline(color, stages), color)
+            record('%s+tiled/%s' % (name, size), lambda: run_pipeline(color, stages, executor), color)
+        for name, convert, _ in displays:
+            for c in (1, 3):
+                record('%s/%s/c%d' % (name, size, c), lambda: convert(images[c]), images[c])
+        del color, images
+    executor.shutdown()
+    return results
+
+
+def metadata(args):
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'cv_threads': cv2.getNumThreads(),
+        'sizes': args.sizes,
+        'repeat': args.repeat,
+    }
+
+
+def compare(results, baseline, threshold, min_delta):
+    """
+    与基线逐项比较
+    :return: 退化项数，耗时增长超过threshold(比例)且绝对增长超过min_delta(秒)的项记为退化
+    """
+    regressions = 0
+    print('\n%-44s %10s %10s %8s' % ('case', 'baseline', 'current', 'ratio'))
+    for case, seconds in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        ratio = seconds / base if base else float('inf')
+        flag = ''
+        if ratio > 1 + threshold and seconds - base > min_delta:
+            flag = '  退化'
+            regressions += 1
+        elif ratio < 1 - threshold and base - seconds > min_delta:
+            flag = '  改善'
+        print('%-44s %8.2fms %8.2fms %7.2fx%s' % (case, base * 1000, seconds * 1000, ratio, flag))
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print('基线中有 %d 项本次未运行' % len(missing))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['VGA', '2MP', '12MP'], choices=SIZES.keys())
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--filter', help='只运行名称匹配该正则的项')
+    parser.add_argument('--cv-threads', type=int, help='OpenCV的线程数，默认不修改')
+    parser.add_argument('-o', '--output', help='结果JSON文件')
+    parser.add_argument('--baseline', help='与之比较的基线JSON文件')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='把结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=0.15, help='耗时增长超过该比例记为退化')
+    parser.add_argument('--min-delta-ms', type=float, default=0.2, help='忽略绝对差值小于该值的变化')
+    args = parser.parse_args()
+    if args.cv_threads is not None:
+        cv2.setNumThreads(args.cv_threads)
+
+    results = run(args)
+    report = {'meta': metadata(args), 'results': results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold, args.min_delta_ms / 1000)
+        print('%d 项退化' % regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+分块执行器的正确性与多核扩展性
+对比整图依次执行与分块执行的结果是否逐像素一致，并测量不同线程数下的耗时
+用法: python -m benchmarks.bench_tiling [--size 24MP] [--tile 512]
+"""
+import argparse
+import os
+
+import numpy as np
+
+from benchmarks.common import SIZES, synthetic_image, best_of, make_stage
+from core.operations import *
+from core.tiling import TileExecutor
+
+
+def chains():
+    """参与测试的操作链，均由可分块的操作组成"""
+    return {
+        'mean5': [make_stage(Filter, ksize=5)],
+        'gauss7': [make_stage(Filter, kind=GAUSSIAN_FILTER, ksize=7)],
+        'median5': [make_stage(Filter, kind=MEDIAN_FILTER, ksize=5)],
+        'open9': [make_stage(Morph, op=OPEN_MORPH_OP, ksize=9, kshape=ELLIPSE_MORPH_SHAPE)],
+        'sobel3': [make_stage(Grad, ksize=3)],
+        'blur+morph+grad+gamma': [
+            make_stage(Filter, kind=GAUSSIAN_FILTER, ksize=5),
+            make_stage(Morph, op=CLOSE_MORPH_OP, ksize=5),
+            make_stage(Grad, kind=LAPLACIAN_GRAD),
+            make_stage(Gamma, gamma=0.8),
+        ],
+    }
+
+
+def run_untiled(img, stages):
+    for stage in stages:
+        img = stage(img)
+    return img
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', default='24MP', choices=SIZES.keys())
+    parser.add_argument('--tile', type=int, default=512)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    img = synthetic_image(*SIZES[args.size])
+    cores = os.cpu_count() or 1
+    workers = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+
+    print('image %s %s, tile %d, %d cores' % (args.size, img.shape, args.tile, cores))
+    print('%-24s %10s' % ('chain', 'untiled') + ''.join('%10s' % ('%dT' % n) for n in workers))
+    for name, stages in chains().items():
+        expected = run_untiled(img, stages)
+        row = '%-24s %9.1fms' % (name, best_of(lambda: run_untiled(img, stages), args.repeat) * 1000)
+        for n in workers:
+            executor = TileExecutor(args.tile, n)
+            if not np.array_equal(executor.run(img, stages), expected):
+                raise AssertionError('%s: tiled result differs with %d workers' % (name, n))
+            row += '%9.1fms' % (best_of(lambda: executor.run(img, stages), args.repeat) * 1000)
+            executor.shutdown()
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
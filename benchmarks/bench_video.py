@@ -0,0 +1,58 @@
+"""
+视频导出的吞吐量
+生成合成视频，用1..N个处理线程导出，报告总帧率和解码、处理、编码各环节单独的帧率
+用法: python -m benchmarks.bench_video [--frames 120] [--size VGA]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+
+from benchmarks.common import SIZES, synthetic_image, make_stage
+from core.operations import *
+from core.video import export_video
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--size', default='VGA', choices=SIZES.keys())
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    stages = [
+        make_stage(Filter, kind=GAUSSIAN_FILTER, ksize=5),
+        make_stage(Morph, op=OPEN_MORPH_OP, ksize=5),
+        make_stage(Gamma, gamma=0.8),
+        Edge(),
+    ]
+    width, height = SIZES[args.size]
+    root = tempfile.mkdtemp(prefix='bench_video_')
+    try:
+        src = os.path.join(root, 'src.avi')
+        writer = cv2.VideoWriter(src, cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+        frames = [synthetic_image(width, height, seed=i) for i in range(8)]
+        for i in range(args.frames):
+            writer.write(frames[i % len(frames)])
+        writer.release()
+
+        print('%d frames, %s, stages: %s' % (args.frames, args.size, [type(s).__name__ for s in stages]))
+        print('%8s %10s %10s %12s %12s %12s' % ('workers', 'seconds', 'fps', 'decode fps', 'process fps',
+                                                 'encode fps'))
+        counts = sorted({args.max_workers} | {2 ** k for k in range(8) if 2 ** k <= args.max_workers})
+        for workers in counts:
+            start = time.perf_counter()
+            meters = export_video(src, os.path.join(root, 'out%d.avi' % workers), stages, workers=workers)
+            elapsed = time.perf_counter() - start
+            print('%8d %10.2f %10.1f %12.1f %12.1f %12.1f' % (
+                workers, elapsed, meters['encode'].frames / elapsed,
+                meters['decode'].fps, meters['process'].fps, meters['encode'].fps))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
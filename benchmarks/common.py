@@ -0,0 +1,54 @@
+"""
+基准测试的公共工具：合成测试图像、计时
+在项目根目录下以 python -m benchmarks.<脚本名> 运行
+"""
+import time
+
+import cv2
+import numpy as np
+
+# 常用图像尺寸(宽, 高)
+SIZES = {
+    'VGA': (640, 480),
+    '2MP': (1920, 1080),
+    '12MP': (4000, 3000),
+    '24MP': (6000, 4000),
+    '50MP': (8660, 5773),
+}
+
+
+def synthetic_image(width, height, channels=3, seed=0):
+    """生成带渐变、边缘和噪声的合成图像，结果可复现"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 127 + 60 * np.sin(x / 37.0) * np.cos(y / 53.0)
+    img = np.empty((height, width, channels), np.uint8)
+    for c in range(channels):
+        noise = rng.normal(0, 12, (height, width)).astype(np.float32)
+        img[..., c] = np.clip(base + noise + 20 * c, 0, 255).astype(np.uint8)
+    # 叠加几何图形，提供直线和边缘
+    for i in range(12):
+        p1 = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        p2 = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(v) for v in rng.integers(0, 256, channels))
+        cv2.line(img, p1, p2, color, thickness=max(1, width // 400))
+        cv2.rectangle(img, p1, (p1[0] + width // 10, p1[1] + height // 10), color, -1)
+    return img[..., 0].copy() if channels == 1 else img
+
+
+def best_of(func, repeat=5, number=1):
+    """执行repeat轮，每轮调用number次，返回单次调用的最短耗时(秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def make_stage(operation, **params):
+    """创建指定参数的操作(core.operations)"""
+    stage = operation()
+    stage.update_params(params)
+    return stage
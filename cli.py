@@ -0,0 +1,91 @@
+"""
+命令行批处理：把界面中保存的处理流程应用到图像文件或目录
+只依赖core中的操作，不加载PyQt5，可以在服务器上运行
+文件分发到多个进程并行处理，中断后重新运行会跳过已完成的文件
+
+用法:
+    python cli.py 流程.json 图像或目录 [图像或目录 ...] -o 输出目录 [-j 进程数]
+"""
+import argparse
+import os
+import sys
+import time
+
+from core.batch import run_batch
+from core.imageio import is_image_file
+from core.pipeline import load_pipeline, dump_pipeline
+from core.resultcache import DEFAULT_CACHE_BYTES
+
+
+def iter_images(paths, recursive=False):
+    """
+    展开输入路径，生成(图像路径, 相对输出目录的路径)
+    目录中的图像保持原有的子目录结构
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                if not recursive:
+                    dirs.clear()
+                for name in sorted(files):
+                    if is_image_file(name):
+                        full = os.path.join(root, name)
+                        yield full, os.path.relpath(full, path)
+        elif is_image_file(path):
+            yield path, os.path.basename(path)
+        else:
+            print('跳过非图像文件: %s' % path, file=sys.stderr)
+
+
+def output_path(out_dir, rel_path, ext=None):
+    if ext:
+        rel_path = os.path.splitext(rel_path)[0] + ext
+    return os.path.join(out_dir, rel_path)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='把保存的处理流程应用到图像文件或目录')
+    parser.add_argument('pipeline', help='界面中保存的处理流程(.json)')
+    parser.add_argument('inputs', nargs='+', help='图像文件或目录')
+    parser.add_argument('-o', '--output', required=True, help='输出目录')
+    parser.add_argument('-r', '--recursive', action='store_true', help='递归处理子目录')
+    parser.add_argument('--ext', help='输出格式的扩展名，如 .png，默认与输入相同')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--cv-threads', type=int, default=1, help='每个进程中OpenCV的线程数，默认为1')
+    parser.add_argument('--overwrite', action='store_true', help='重新处理已由同一流程生成的输出文件')
+    parser.add_argument('--cache-dir', help='处理结果的磁盘缓存目录，同一文件内容、同一流程的结果直接取自缓存，'
+                                            '可与界面共用(~/.cache/opencv-image-processing/results)')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help='磁盘缓存的总大小上限(MB)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    pipeline = dump_pipeline(load_pipeline(args.pipeline))  # 先在主进程中校验流程
+    jobs = [(src_path, output_path(args.output, rel_path, args.ext))
+            for src_path, rel_path in iter_images(args.inputs, args.recursive)]
+    done = []
+
+    def progress(result):
+        done.append(result)
+        prefix = '[%d/%d]' % (len(done), len(jobs))
+        if result.status == 'failed':
+            print('%s 处理失败 %s: %s' % (prefix, result.src, result.error), file=sys.stderr)
+        elif result.status == 'skipped':
+            print('%s 已由同一流程生成，跳过 %s' % (prefix, result.dst))
+        else:
+            print('%s %s -> %s (%.0fms)' % (prefix, result.src, result.dst, result.seconds * 1000))
+
+    start = time.perf_counter()
+    results = run_batch(pipeline, jobs, args.workers, args.cv_threads, resume=not args.overwrite,
+                        progress=progress, cache_dir=args.cache_dir, cache_bytes=args.cache_mb * 1024 * 1024)
+    elapsed = time.perf_counter() - start
+    counts = {status: sum(r.status == status for r in results) for status in ('done', 'skipped', 'failed')}
+    print('完成 %(done)d, 跳过 %(skipped)d, 失败 %(failed)d' % counts,
+          '用时 %.1fs, %.2f 文件/秒' % (elapsed, counts['done'] / elapsed if elapsed else 0))
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
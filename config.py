@@ -1,7 +1,60 @@
+import os
+
 from custom.tableWidget import *
 from custom.listWidgetItems import *
 
 
+# 逐级结果缓存的内存上限(字节)，超出后按LRU淘汰中间结果
+STAGE_CACHE_BYTES = 512 * 1024 * 1024
+
+# 预览模式：交互时在与视口分辨率相当的缩小图上处理，停止操作一段时间后再渲染原图
+PREVIEW_MAX_SCALE = 0.75  # 缩放比例高于此值时直接处理原图
+PREVIEW_IDLE_MS = 400  # 停止操作多久后渲染原始分辨率
+
+# 分块多线程执行：像素数不小于TILE_MIN_PIXELS的图像按TILE_SIZE分块，TILE_WORKERS为线程数(None表示CPU核数)
+TILE_SIZE = 512
+TILE_MIN_PIXELS = 4 * 1024 * 1024
+TILE_WORKERS = None
+
+# 分块显示：结果按DISPLAY_TILE_SIZE分块、多级缩小后只转换可见的块，转换好的块最多占用DISPLAY_CACHE_BYTES
+DISPLAY_TILE_SIZE = 256
+DISPLAY_CACHE_BYTES = 256 * 1024 * 1024
+
+# 直方图面板：像素数超过该值的图像按跨步采样统计
+HISTOGRAM_MAX_SAMPLES = 1024 * 1024
+
+# 目录缩略图：长边像素数、磁盘缓存目录及大小上限、生成缩略图的线程数
+THUMBNAIL_SIZE = 96
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'opencv-image-processing', 'thumbnails')
+THUMBNAIL_CACHE_BYTES = 256 * 1024 * 1024
+THUMBNAIL_WORKERS = 4
+
+# 解码后原图的缓存：内存上限及预取相邻图像的线程数
+IMAGE_CACHE_BYTES = 1024 * 1024 * 1024
+PREFETCH_WORKERS = 2
+
+# 超大图像：像素数超过LARGE_IMAGE_PIXELS时先按缩小倍数解码(长边不小于FIRST_DISPLAY_SIDE)用于首次显示，
+# 放大或导出需要更高分辨率时再在后台加载原图
+LARGE_IMAGE_PIXELS = 50 * 1000 * 1000
+FIRST_DISPLAY_SIDE = 2048
+
+# 性能分析：保留最近多少次处理的记录用于导出
+PROFILE_HISTORY = 200
+
+# 处理结果的磁盘缓存：按源文件内容和操作链寻址，界面和批处理共用，总大小超过上限时删除最久未使用的结果
+RESULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'opencv-image-processing', 'results')
+RESULT_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+# 撤销/重做：最多保留的历史记录数，以及历史记录附带的处理结果的内存上限
+HISTORY_LENGTH = 100
+HISTORY_BYTES = 256 * 1024 * 1024
+
+# 视频：实时播放时各环节之间队列的长度(越小延迟越低，处理跟不上时丢弃最旧的帧)，
+# 导出时并行处理帧的线程数(None为CPU核数)
+VIDEO_QUEUE_SIZE = 2
+VIDEO_EXPORT_WORKERS = None
+
+
 # Implemented functions
 items = [
     GrayingItem,
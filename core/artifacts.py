@@ -0,0 +1,53 @@
+"""
+由参数生成的小型数据(查找表、结构元素等)的共享缓存
+交互调参和批处理时同样的参数会反复出现，缓存后不必每次重新生成
+"""
+import threading
+from collections import OrderedDict
+
+
+class ArtifactCache:
+    """按参数元组缓存生成结果，条目数有上限，按LRU淘汰，记录命中和未命中次数"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0  # 命中次数
+        self.misses = 0  # 未命中(重新生成)次数
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, build):
+        """
+        获取key对应的数据，不存在时调用build()生成
+        生成的NumPy数组被设为只读，防止共享的数据被意外修改
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        # 生成过程可能再次访问缓存(如复合查找表)，不能持有锁
+        value = build()
+        if hasattr(value, 'flags'):
+            value.flags.writeable = False
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+artifacts = ArtifactCache()  # 所有操作共享的缓存
@@ -0,0 +1,201 @@
+"""
+多进程批处理
+把序列化的处理流程(core.pipeline.dump_pipeline)分发到进程池，逐个文件处理并写入输出目录
+- 同时在途的文件数有上限，内存占用不随文件总数增长
+- 输出先写临时文件再原子替换，中断后重新运行会跳过已完成的文件；
+  输出目录中的清单记录每个输出文件由哪个流程生成，流程改变后不会把旧的输出当作已完成
+- 单个文件出错只记录错误，不影响其它文件
+- 可选的磁盘结果缓存(core.resultcache)：同一文件内容、同一流程的结果直接取自缓存，不再解码和处理
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+from core.imageio import read_image, write_image
+from core.pipeline import build_pipeline, run_pipeline
+from core.resultcache import ResultCache, DEFAULT_CACHE_BYTES, pipeline_fingerprint
+
+# 单个文件的处理结果，status为 'done' / 'skipped' / 'failed'
+FileResult = namedtuple('FileResult', 'src dst status error seconds pixels')
+
+MANIFEST_NAME = '.pipeline-manifest.json'  # 输出目录中的清单文件名
+MANIFEST_FLUSH = 32  # 每完成多少个文件写一次清单，中断时最多重新处理这么多文件
+
+_stages = None  # 工作进程中重建的操作链
+_results = None  # 工作进程中的磁盘结果缓存
+
+
+def _init_worker(pipeline, cv_threads, cache_dir=None, cache_bytes=DEFAULT_CACHE_BYTES):
+    """工作进程初始化：限制OpenCV内部线程数，避免与进程池叠加造成过度订阅"""
+    global _stages, _results
+    cv2.setNumThreads(cv_threads)
+    _stages = build_pipeline(pipeline)
+    if cache_dir is not None:
+        _results = ResultCache(cache_dir, cache_bytes)
+
+
+def temp_path(dst):
+    """与dst同目录、同扩展名的临时文件名(扩展名决定编码格式)"""
+    root, ext = os.path.splitext(dst)
+    return '%s.part%d%s' % (root, os.getpid(), ext)
+
+
+def process_file(src, dst, stages, results=None):
+    """
+    处理单个文件并原子地写入输出，返回处理的像素数
+    :param results: 可选的磁盘结果缓存，命中时不解码也不处理，像素数按结果的尺寸计
+    """
+    img = results.get(src, stages) if results is not None and stages else None
+    if img is not None:
+        pixels = img.shape[0] * img.shape[1]
+    else:
+        img = read_image(src)
+        if img is None:
+            raise ValueError('无法解码图像')
+        pixels = img.shape[0] * img.shape[1]
+        img = run_pipeline(img, stages)
+        if results is not None and stages:
+            results.put(src, stages, img)
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    tmp = temp_path(dst)
+    try:
+        write_image(tmp, img)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return pixels
+
+
+def same_file(a, b):
+    """两个路径是否指向同一文件(文件可以不存在)"""
+    if os.path.exists(a) and os.path.exists(b):
+        return os.path.samefile(a, b)
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+class OutputManifest:
+    """
+    输出目录中的清单: 输出文件名 -> 生成它的流程摘要
+    续做时只跳过清单中记录为当前流程的输出，只在主进程中使用
+    """
+
+    def __init__(self, digest):
+        self.digest = digest  # 当前流程的摘要
+        self._dirs = {}  # 输出目录 -> 清单内容
+        self._dirty = set()
+
+    def entries(self, directory):
+        entries = self._dirs.get(directory)
+        if entries is None:
+            try:
+                with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}  # 没有清单或已损坏，所有输出都重新处理
+            self._dirs[directory] = entries
+        return entries
+
+    def is_current(self, dst):
+        """dst存在且由当前流程生成"""
+        directory, name = os.path.split(dst)
+        return self.entries(directory).get(name) == self.digest and os.path.exists(dst)
+
+    def mark(self, dst):
+        directory, name = os.path.split(dst)
+        self.entries(directory)[name] = self.digest
+        self._dirty.add(directory)
+
+    def save(self):
+        """原子地写回有改动的清单"""
+        for directory in self._dirty:
+            path = os.path.join(directory, MANIFEST_NAME)
+            tmp = '%s.part%d' % (path, os.getpid())
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self._dirs[directory], f)
+                os.replace(tmp, path)
+            except OSError:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        self._dirty.clear()
+
+
+def _run_job(job):
+    src, dst = job
+    start = time.perf_counter()
+    try:
+        pixels = process_file(src, dst, _stages, _results)
+        return FileResult(src, dst, 'done', None, time.perf_counter() - start, pixels)
+    except Exception as e:
+        return FileResult(src, dst, 'failed', '%s: %s' % (type(e).__name__, e), time.perf_counter() - start, 0)
+
+
+def run_batch(pipeline, jobs, workers=None, cv_threads=1, resume=True, max_in_flight=None,
+              progress=None, cancelled=None, cache_dir=None, cache_bytes=DEFAULT_CACHE_BYTES):
+    """
+    在进程池中批量处理
+    :param pipeline: dump_pipeline的结果，传给每个工作进程重建操作链
+    :param jobs: (输入路径, 输出路径)的可迭代对象，按需读取
+    :param workers: 进程数，默认为CPU核数
+    :param cv_threads: 每个进程中OpenCV的线程数
+    :param resume: 为True时跳过输出已存在且由同一流程生成的文件，为False时全部重新处理
+    :param max_in_flight: 同时提交给进程池的文件数上限，默认为进程数的2倍
+    :param progress: 每个文件完成(或跳过)后调用progress(result)
+    :param cancelled: 返回True时停止提交新文件，已提交的文件处理完后返回
+    :param cache_dir: 磁盘结果缓存的目录，多个工作进程和界面可以共用，None时不使用
+    :param cache_bytes: 磁盘结果缓存的总大小上限
+    :return: FileResult列表
+    """
+    workers = workers or os.cpu_count() or 1
+    slots = threading.BoundedSemaphore(max_in_flight or 2 * workers)
+    results = []
+    lock = threading.Lock()
+    # 清单与磁盘结果缓存使用同一个操作链指纹判断流程是否改变
+    fingerprint = pipeline_fingerprint(build_pipeline(pipeline))
+    manifest = OutputManifest(hashlib.sha1(fingerprint.encode('utf-8')).hexdigest())
+
+    def finish(result):
+        with lock:
+            results.append(result)
+            if result.status == 'done':
+                manifest.mark(result.dst)
+                if len(results) % MANIFEST_FLUSH == 0:
+                    manifest.save()
+            if progress is not None:
+                progress(result)
+
+    def on_done(result):
+        finish(result)
+        slots.release()
+
+    # spawn方式启动，避免在带有界面线程的进程中fork
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ctx.Pool(workers, initializer=_init_worker,
+                      initargs=(pipeline, cv_threads, cache_dir, cache_bytes)) as pool:
+            for src, dst in jobs:
+                if cancelled is not None and cancelled():
+                    break
+                if same_file(src, dst):
+                    finish(FileResult(src, dst, 'failed', '输出与输入是同一文件', 0.0, 0))
+                    continue
+                if resume and manifest.is_current(dst):
+                    finish(FileResult(src, dst, 'skipped', None, 0.0, 0))
+                    continue
+                slots.acquire()
+                pool.apply_async(_run_job, ((src, dst),), callback=on_done,
+                                 error_callback=lambda e, src=src, dst=dst: on_done(
+                                     FileResult(src, dst, 'failed', str(e), 0.0, 0)))
+            pool.close()
+            pool.join()
+    finally:
+        with lock:
+            manifest.save()
+    return results
@@ -0,0 +1,89 @@
+"""
+磁盘缓存的公共部分：原子写入、按最近使用时间淘汰
+- 缓存文件先写到同目录的临时文件再原子替换，读取方不会看到写了一半的文件
+- 读取命中时更新文件的修改时间，作为最近使用时间
+- 总大小超过上限时从最久未使用的文件开始删除
+多个线程、多个进程可以同时使用同一个缓存目录：写入互不干扰，
+文件随时可能被其它进程淘汰，读取失败按未命中处理
+"""
+import os
+import threading
+
+
+class DiskCache:
+    """缓存目录中文件的写入和淘汰，文件的命名和编码由子类决定"""
+
+    def __init__(self, directory, max_bytes):
+        """
+        :param directory: 缓存目录
+        :param max_bytes: 缓存文件总大小的上限
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None  # 缓存文件总大小，第一次写入时统计
+
+    def touch(self, cached):
+        """更新修改时间，作为最近使用时间"""
+        try:
+            os.utime(cached)
+        except OSError:
+            pass
+
+    def write(self, cached, write):
+        """
+        原子地写入缓存文件，写入失败时只是不缓存
+        :param write: write(临时文件路径)，临时文件与cached的扩展名相同
+        :return: 是否写入成功
+        """
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        root, ext = os.path.splitext(cached)
+        tmp = '%s.%d-%d%s' % (root, os.getpid(), threading.get_ident(), ext)
+        try:
+            write(tmp)
+            os.replace(tmp, cached)
+        except (OSError, ValueError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self.disk_usage()
+            else:
+                try:
+                    self._bytes += os.path.getsize(cached)
+                except OSError:
+                    pass  # 已被其它进程淘汰
+            if self._bytes > self.max_bytes:
+                self.prune(self.max_bytes * 3 // 4)
+        return True
+
+    def files(self):
+        """缓存目录中的全部缓存文件[(修改时间, 大小, 路径)]"""
+        result = []
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue  # 可能已被其它进程删除
+                result.append((st.st_mtime, st.st_size, full))
+        return result
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self.files())
+
+    def prune(self, target):
+        """按最近使用时间从旧到新删除缓存文件，直到总大小不超过target"""
+        files = sorted(self.files())
+        total = sum(size for _, size, _ in files)
+        for _, size, full in files:
+            if total <= target:
+                break
+            try:
+                os.remove(full)
+            except OSError:
+                continue
+            total -= size
+        self._bytes = total
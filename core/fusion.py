@@ -0,0 +1,85 @@
+"""
+逐像素操作的合并
+连续的逐像素操作(亮度调节、伽马校正、阈值处理、灰度化)被合并为一个操作：
+各级的查找表预先复合为一张256项的表，整段只遍历一次图像，不产生中间的整图临时数组
+"""
+import cv2
+import numpy as np
+
+from core.artifacts import artifacts
+from core.operations import fingerprint
+
+
+class FusedPointwise:
+    """
+    合并后的逐像素操作，等价于依次执行stages
+    执行顺序: 彩色查表 -> 转灰度 -> 灰度查表，没有用到的步骤会被跳过
+    """
+
+    def __init__(self, stages):
+        self.stages = stages  # 被合并的操作
+        # 转灰度之前作用于各通道的查找表, 是否转为灰度, 转灰度之后作用于灰度的查找表
+        key = ('fused',) + tuple(fingerprint(stage) for stage in stages)
+        self.pre, self.gray, self.post = artifacts.get(key, lambda: compose(stages))
+
+    def halo(self):
+        return 0
+
+    def __call__(self, img):
+        if img.dtype != np.uint8:
+            # 查找表只适用于8位图像，其它位深依次执行原操作
+            for stage in self.stages:
+                img = stage(img)
+            return img
+        if self.pre is not None:
+            img = cv2.LUT(img, self.pre)
+        if self.gray:
+            if img.ndim == 3:
+                img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+            if self.post is not None:
+                img = cv2.LUT(img, self.post)
+        return img
+
+
+def compose(stages):
+    """把各级的查找表复合为(转灰度之前的查找表, 是否转为灰度, 转灰度之后的查找表)"""
+    pre, gray, post = None, False, None
+    for stage in stages:
+        to_gray, lut = stage.pointwise()
+        # 转灰度之后的操作都作用于单通道图像，只需在第一次转灰度时转换
+        gray = gray or to_gray
+        if lut is None:
+            continue
+        if gray:
+            post = lut if post is None else lut[post]
+        else:
+            pre = lut if pre is None else lut[pre]
+    return pre, gray, post
+
+
+def pointwise_length(stages, start):
+    """从start开始连续的逐像素操作数"""
+    n = 0
+    for stage in stages[start:]:
+        if stage.pointwise() is None:
+            break
+        n += 1
+    return n
+
+
+def compile_stages(stages):
+    """
+    把连续两个及以上的逐像素操作合并为FusedPointwise
+    :return: [(覆盖的原操作数, 操作)]，按原顺序排列
+    """
+    plan = []
+    i = 0
+    while i < len(stages):
+        n = pointwise_length(stages, i)
+        if n >= 2:
+            plan.append((n, FusedPointwise(stages[i:i + n])))
+            i += n
+        else:
+            plan.append((1, stages[i]))
+            i += 1
+    return plan
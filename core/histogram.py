@@ -0,0 +1,34 @@
+"""
+直方图统计
+各通道分别用cv2.calcHist统计，超大图像可以只统计跨步采样的像素
+"""
+import math
+
+import cv2
+import numpy as np
+
+
+def sample_step(height, width, max_samples=None):
+    """采样像素数不超过max_samples时行列方向的跨步"""
+    if not max_samples or height * width <= max_samples:
+        return 1
+    return math.ceil(math.sqrt(height * width / max_samples))
+
+
+def histogram(img, max_samples=None):
+    """
+    计算各通道的直方图
+    :param img: 单通道或多通道图像，16位图像按高8位统计，其它类型截断到0~255
+    :param max_samples: 像素数超过该值时按跨步采样统计
+    :return: 形状为(通道数, 256)的计数数组
+    """
+    step = sample_step(img.shape[0], img.shape[1], max_samples)
+    if step > 1:
+        img = img[::step, ::step]
+    channels = 1 if img.ndim == 2 else img.shape[2]
+    if img.dtype == np.uint16:
+        img = (img >> 8).astype(np.uint8)
+    elif img.dtype != np.uint8:
+        img = np.clip(img, 0, 255).astype(np.uint8)
+    img = np.ascontiguousarray(img)  # 跨步采样的视图复制一次，各通道共用
+    return np.stack([cv2.calcHist([img], [c], None, [256], [0, 256])[:, 0] for c in range(channels)]).astype(np.int64)
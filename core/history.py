@@ -0,0 +1,139 @@
+"""
+处理流程的撤销/重做历史
+每条记录保存操作链的紧凑描述(core.pipeline.dump_pipeline的结果)，
+内存允许时再附带该状态下的处理结果，撤销后可以立即显示而不必重新处理
+处理结果的总字节数有上限，超出时按最近最少使用淘汰，操作链描述本身只按条数限制
+本模块不依赖Qt
+"""
+import time
+from collections import OrderedDict
+
+
+class HistoryEntry:
+    """一条历史记录"""
+
+    def __init__(self, pipeline, edited=None):
+        self.pipeline = pipeline  # 操作链描述
+        self.edited = edited  # 相对上一条记录只修改了一级的参数时为该级的位置，用于合并连续的调参
+        self.time = time.monotonic()  # 最后一次修改的时间
+        self.result = None  # 处理结果: (缓存键, 图像, 缩放比例)
+
+
+def changed_stage(old, new):
+    """两个操作链只有一级的参数不同时返回该级的位置，否则返回None"""
+    a, b = old['stages'], new['stages']
+    if len(a) != len(b) or any(x['type'] != y['type'] for x, y in zip(a, b)):
+        return None
+    changed = [i for i, (x, y) in enumerate(zip(a, b)) if x['params'] != y['params']]
+    return changed[0] if len(changed) == 1 else None
+
+
+class EditHistory:
+    """线性的编辑历史，撤销后做新的修改会丢弃可重做的记录"""
+
+    def __init__(self, max_bytes, max_entries=100, merge_seconds=1.0):
+        """
+        :param max_bytes: 附带的处理结果的内存上限
+        :param max_entries: 最多保留的记录数，超出时丢弃最早的记录
+        :param merge_seconds: 在此时间内连续修改同一级的参数只保留一条记录(拖动滑块等)
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.merge_seconds = merge_seconds
+        self._entries = []
+        self._index = -1  # 当前状态对应的记录
+        self._results = OrderedDict()  # 附带处理结果的记录(按id) -> 记录，按LRU排列
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    @property
+    def current(self):
+        return self._entries[self._index] if self._entries else None
+
+    def can_undo(self):
+        return self._index > 0
+
+    def can_redo(self):
+        return self._index < len(self._entries) - 1
+
+    def record(self, pipeline):
+        """
+        记录修改后的操作链，与当前记录相同时忽略
+        :return: 是否新增或更新了记录
+        """
+        current = self.current
+        if current is not None and current.pipeline == pipeline:
+            return False
+        edited = changed_stage(current.pipeline, pipeline) if current is not None else None
+        if (edited is not None and edited == current.edited and not self.can_redo()
+                and time.monotonic() - current.time < self.merge_seconds):
+            # 连续调整同一级的参数，合并到当前记录
+            self._drop_result(current)
+            current.pipeline = pipeline
+            current.time = time.monotonic()
+            return True
+        for entry in self._entries[self._index + 1:]:
+            self._drop_result(entry)
+        del self._entries[self._index + 1:]
+        self._entries.append(HistoryEntry(pipeline, edited))
+        if len(self._entries) > self.max_entries:
+            self._drop_result(self._entries.pop(0))
+        self._index = len(self._entries) - 1
+        return True
+
+    def undo(self):
+        """回到上一条记录并返回它，没有可撤销的记录时返回None"""
+        if not self.can_undo():
+            return None
+        self._index -= 1
+        return self._touch(self.current)
+
+    def redo(self):
+        """前进到下一条记录并返回它，没有可重做的记录时返回None"""
+        if not self.can_redo():
+            return None
+        self._index += 1
+        return self._touch(self.current)
+
+    def attach(self, key, img, scale=1.0):
+        """
+        为当前记录附带处理结果，调用者需保证结果对应当前记录的操作链
+        :param key: 结果在逐级缓存中的键(core.pipeline.result_key)
+        :param scale: 结果相对原图的缩放比例
+        """
+        entry = self.current
+        if entry is None or img.nbytes > self.max_bytes:
+            return
+        self._drop_result(entry)
+        entry.result = (key, img, scale)
+        self._results[id(entry)] = entry
+        self._bytes += img.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._results.popitem(last=False)
+            self._bytes -= evicted.result[1].nbytes
+            evicted.result = None
+
+    def drop_results(self):
+        """丢弃所有附带的处理结果(原图变化后它们不再有效)"""
+        for entry in self._results.values():
+            entry.result = None
+        self._results.clear()
+        self._bytes = 0
+
+    def _touch(self, entry):
+        if entry.result is not None:
+            self._results.move_to_end(id(entry))
+        entry.edited = None  # 撤销或重做之后的调参不再合并到这条记录
+        return entry
+
+    def _drop_result(self, entry):
+        if entry.result is not None:
+            del self._results[id(entry)]
+            self._bytes -= entry.result[1].nbytes
+            entry.result = None
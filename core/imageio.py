@@ -0,0 +1,226 @@
+"""
+图像文件读写
+文件内容映射到内存后由OpenCV解码，支持中文路径，解码前不需要把整个文件读入进程的堆内存
+大图像可以先按缩小倍数解码用于首次显示：JPEG在解码时直接缩小，
+未压缩的BMP直接从映射的文件中隔行隔列取样，只读取需要的部分
+"""
+import os
+import struct
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')  # 支持的图像格式
+
+# 导出时各格式可调的编码参数: 扩展名 -> (名称, OpenCV参数, 最小值, 最大值, 默认值)
+ENCODE_OPTIONS = {
+    '.jpg': ('JPEG质量', cv2.IMWRITE_JPEG_QUALITY, 0, 100, 95),
+    '.jpeg': ('JPEG质量', cv2.IMWRITE_JPEG_QUALITY, 0, 100, 95),
+    '.png': ('PNG压缩级别', cv2.IMWRITE_PNG_COMPRESSION, 0, 9, 3),
+    '.webp': ('WebP质量(101为无损)', cv2.IMWRITE_WEBP_QUALITY, 1, 101, 90),
+}
+
+REDUCED_FACTORS = (8, 4, 2, 1)  # 缩小倍数，从大到小
+# 8位彩色/灰度图像解码时直接缩小的读取方式: 文件头判断的类型 -> {缩小倍数: 读取方式}
+# 与read_image(cv2.IMREAD_UNCHANGED)得到的通道数和位深一致，其它图像(带透明度、16位等)完整解码后再缩小
+# IMREAD_UNCHANGED不按EXIF方向旋转，这里也都加上IMREAD_IGNORE_ORIENTATION，否则缩小图与原图的宽高可能互换
+REDUCED_FLAGS = {
+    kind: {factor: flags | cv2.IMREAD_IGNORE_ORIENTATION for factor, flags in table.items()}
+    for kind, table in (
+        ('color', {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                   2: cv2.IMREAD_REDUCED_COLOR_2, 1: cv2.IMREAD_COLOR}),
+        ('gray', {8: cv2.IMREAD_REDUCED_GRAYSCALE_8, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                  2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 1: cv2.IMREAD_GRAYSCALE}),
+    )
+}
+
+
+def is_image_file(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def map_file(path):
+    """把文件只读地映射到内存，空文件返回None"""
+    if os.path.getsize(path) == 0:
+        return None
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def read_image(path, flags=cv2.IMREAD_UNCHANGED):
+    """
+    读取图像文件，无法解码时返回None
+    :param flags: cv2.imdecode的读取方式，默认保留原始通道数和位深
+    """
+    buf = map_file(path)
+    return None if buf is None else cv2.imdecode(buf, flags)
+
+
+def bmp_pixels(buf):
+    """
+    未压缩的24/32位BMP中像素数据的视图(行按从上到下的顺序)，不复制数据
+    其它BMP(调色板、压缩、位域)返回None
+    """
+    if len(buf) < 54 or bytes(buf[:2]) != b'BM':
+        return None
+    offset, = struct.unpack_from('<I', buf, 10)
+    width, height, _, bits, compression = struct.unpack_from('<iiHHI', buf, 18)
+    if compression != 0 or bits not in (24, 32) or width <= 0 or height == 0:
+        return None
+    channels = bits // 8
+    stride = (width * channels + 3) // 4 * 4  # 每行补齐到4字节
+    rows = abs(height)
+    if offset + stride * rows > len(buf):
+        return None
+    pixels = buf[offset:offset + stride * rows].reshape(rows, stride)[:, :width * channels]
+    pixels = pixels.reshape(rows, width, channels)
+    return pixels[::-1] if height > 0 else pixels  # 高度为正时按从下到上的顺序存储
+
+
+def jpeg_frame(buf):
+    """从JPEG的SOF段读取(宽, 高, 样本位数, 分量数)"""
+    pos = 2
+    while pos + 9 < len(buf):
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # 填充字节
+            continue
+        length, = struct.unpack_from('>H', buf, pos + 2)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            precision, height, width, components = struct.unpack_from('>BHHB', buf, pos + 4)
+            return width, height, precision, components
+        pos += 2 + length
+    return None
+
+
+def jpeg_size(buf):
+    """从JPEG的SOF段读取(宽, 高)"""
+    frame = jpeg_frame(buf)
+    return None if frame is None else frame[:2]
+
+
+def tiff_size(buf):
+    """从TIFF第一个IFD的ImageWidth(256)、ImageLength(257)标签读取(宽, 高)"""
+    order = '<' if bytes(buf[:2]) == b'II' else '>'
+    offset, = struct.unpack_from(order + 'I', buf, 4)
+    if offset + 2 > len(buf):
+        return None
+    count, = struct.unpack_from(order + 'H', buf, offset)
+    size = {}
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        if entry + 12 > len(buf):
+            return None
+        tag, kind = struct.unpack_from(order + 'HH', buf, entry)
+        if tag in (256, 257):
+            # 类型3为SHORT，4为LONG，值直接存放在条目中
+            size[tag], = struct.unpack_from(order + ('H' if kind == 3 else 'I'), buf, entry + 8)
+    if 256 in size and 257 in size:
+        return size[256], size[257]
+    return None
+
+
+def image_size(path):
+    """只读取文件头得到图像的(宽, 高)，支持JPEG、PNG、BMP、TIFF，其它格式或无法识别时返回None"""
+    buf = map_file(path)
+    return None if buf is None else header_size(buf)
+
+
+def header_size(buf):
+    """从映射的文件内容的文件头中读取(宽, 高)"""
+    if len(buf) < 26:
+        return None
+    head = bytes(buf[:26])
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return struct.unpack_from('>II', head, 16)
+    if head.startswith(b'\xff\xd8'):
+        return jpeg_size(buf)
+    if head.startswith(b'BM'):
+        width, height = struct.unpack_from('<ii', head, 18)
+        return width, abs(height)
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return tiff_size(buf)
+    return None
+
+
+def header_kind(buf):
+    """
+    从文件头判断图像能否在解码时直接缩小
+    :return: 8位3通道为'color'，8位单通道为'gray'，其它(带透明度、调色板、16位、无法识别)为None
+    """
+    head = bytes(buf[:30])
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and len(head) >= 26:
+        depth, color_type = head[24], head[25]
+        if color_type == 0 and depth <= 8:
+            return 'gray'
+        if color_type == 2 and depth == 8:
+            return 'color'
+        return None
+    if head.startswith(b'\xff\xd8'):
+        frame = jpeg_frame(buf)
+        if frame is not None and frame[2] == 8:
+            return {1: 'gray', 3: 'color'}.get(frame[3])
+        return None
+    if head.startswith(b'BM') and len(head) >= 30:
+        bits, = struct.unpack_from('<H', head, 28)
+        return 'color' if bits == 24 else None
+    return None
+
+
+def reduce_factor(size, min_side):
+    """长边缩小后不小于min_side的最大倍数"""
+    return next(f for f in REDUCED_FACTORS if f == 1 or max(size) / f >= min_side)
+
+
+def read_reduced(path, min_side):
+    """
+    按尽量大的缩小倍数读取图像，长边不小于min_side(原图更小时为原图)
+    通道数和位深与read_image的结果相同：8位彩色/灰度图像解码时直接缩小，
+    带透明度、16位等图像完整解码后用INTER_AREA缩小
+    文件头中有尺寸时直接确定倍数，否则从最大的倍数开始尝试
+    :return: (图像, 缩小倍数)，无法解码时图像为None
+    """
+    buf = map_file(path)
+    if buf is None:
+        return None, 1
+    size = header_size(buf)
+    kind = header_kind(buf)
+    factors = REDUCED_FACTORS
+    if size is not None:
+        factors = (reduce_factor(size, min_side),)
+        pixels = bmp_pixels(buf) if factors[0] > 1 else None
+        if pixels is not None:
+            # 未压缩的BMP直接隔行隔列取样，只有取到的行所在的页被读入内存，32位BMP保留第4个通道
+            factor = factors[0]
+            return np.ascontiguousarray(pixels[::factor, ::factor]), factor
+    if kind is None:
+        img = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            return None, 1
+        h, w = img.shape[:2]
+        factor = reduce_factor((w, h), min_side)
+        if factor > 1:
+            size = (max(1, -(-w // factor)), max(1, -(-h // factor)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        return img, factor
+    img = None
+    for factor in factors:
+        img = cv2.imdecode(buf, REDUCED_FLAGS[kind][factor])
+        if img is None or factor == 1 or max(img.shape[:2]) >= min_side:
+            break
+    return img, factor
+
+
+def encode_params(path, value):
+    """按扩展名生成write_image的编码参数，没有可调参数的格式返回空列表"""
+    option = ENCODE_OPTIONS.get(os.path.splitext(path)[1].lower())
+    return [option[1], int(value)] if option is not None else []
+
+
+def write_image(path, img, params=None):
+    """按扩展名编码并写入图像文件"""
+    ok, buf = cv2.imencode(os.path.splitext(path)[1], img, params or [])
+    if not ok:
+        raise ValueError('无法编码图像: %s' % path)
+    buf.tofile(path)
@@ -0,0 +1,125 @@
+"""
+解码后原图的内存缓存
+在目录中前后切换图像时，最近看过的图像直接取自缓存，相邻的图像在后台线程中预先解码
+缓存的图像被设为只读，防止共享的原图被处理过程意外修改
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from core.imageio import read_image
+
+
+class ImageLoader:
+    """按文件(路径, 修改时间, 大小)缓存解码结果，总字节数有上限，按LRU淘汰"""
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024, workers=2):
+        """
+        :param max_bytes: 缓存图像的内存上限
+        :param workers: 预取线程数
+        """
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 文件标识 -> 图像
+        self._bytes = 0
+        self._loading = {}  # 正在后台解码的文件标识 -> Future
+        self._pool = None
+
+    @staticmethod
+    def file_key(path):
+        """文件标识，文件被修改后缓存自动失效，文件不存在时返回None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+    def get(self, path):
+        """
+        获取解码后的图像，无法解码时返回None
+        缓存中没有时：正在预取则等待预取完成，否则在当前线程中解码
+        """
+        key = self.file_key(path)
+        if key is None:
+            return None
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                return img
+            future = self._loading.get(key)
+        if future is not None:
+            return future.result()
+        return self._load(key)
+
+    def cached(self, path):
+        """缓存中的图像，没有时返回None，不解码"""
+        key = self.file_key(path)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+            return img
+
+    def load_async(self, path, callback):
+        """在后台解码，完成后在解码线程中调用callback(图像)，无法解码时图像为None"""
+        img = self.cached(path)
+        if img is not None:
+            callback(img)
+            return
+        self.prefetch([path])
+        with self._lock:
+            future = self._loading.get(self.file_key(path))
+        if future is None:  # 刚好已解码完成或文件不存在
+            callback(self.get(path))
+            return
+
+        def done(f):
+            callback(None if f.cancelled() or f.exception() is not None else f.result())
+        future.add_done_callback(done)
+
+    def prefetch(self, paths):
+        """在后台解码缓存中还没有的文件"""
+        for path in paths:
+            key = self.file_key(path)
+            if key is None:
+                continue
+            with self._lock:
+                if key in self._entries or key in self._loading:
+                    continue
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='prefetch')
+                self._loading[key] = self._pool.submit(self._load, key)
+
+    def _load(self, key):
+        try:
+            img = read_image(key[0])
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+        if img is None:
+            return None
+        img.setflags(write=False)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = img
+                self._bytes += img.nbytes
+            # 至少保留刚解码的图像
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+        return img
+
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def shutdown(self):
+        """放弃尚未开始的预取"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,397 @@
+"""
+图像处理操作
+只依赖NumPy和OpenCV，不依赖Qt，可以在没有界面的环境(服务器、命令行)中使用
+界面中的列表项(custom.listWidgetItems)包装这里的操作
+"""
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+from flags import *  # 导入图像处理相关常量定义
+from core.artifacts import artifacts
+
+RAMP = np.arange(256, dtype=np.uint8).reshape(1, 256)  # 0~255的灰度阶，用于生成查找表
+
+
+class Operation(ABC):
+    """
+    所有图像处理操作的抽象基类，子类必须实现process
+    以单下划线开头的属性即为操作的参数
+    """
+    # 以像素为单位的参数，在缩小的预览图上处理时需要按比例缩放
+    # 参数名 -> 缩放后是否必须为奇数(如核大小)，None表示实数参数(如标准差)，缩放后不取整
+    spatial_params = {}
+
+    def get_params(self):
+        """获取所有以单下划线开头的保护属性，转换为字典格式(ABC内部的_abc_impl除外)"""
+        protected = [v for v in dir(self) if v.startswith('_') and not v.startswith('__') and v != '_abc_impl']
+        param = {}
+        for v in protected:
+            param[v.replace('_', '', 1)] = self.__getattribute__(v)
+        return param
+
+    def update_params(self, param):
+        """根据参数字典更新对应保护属性的值"""
+        for k, v in param.items():
+            if '_' + k in dir(self):
+                self.__setattr__('_' + k, v)
+
+    def copy(self, scale=1.0):
+        """
+        创建参数相同的独立副本
+        :param scale: 图像的缩放比例，像素单位的参数随之缩放，使预览效果与原图一致
+        """
+        op = type(self)()
+        params = self.get_params()
+        if scale != 1.0:
+            for name, odd in self.spatial_params.items():
+                params[name] = scale_pixels(params[name], scale, odd)
+        op.update_params(params)
+        return op
+
+    def is_valid(self):
+        """当前参数是否有效"""
+        return True
+
+    def halo(self):
+        """
+        邻域半径：输出像素只依赖输入中该半径内的像素，逐像素操作为0
+        依赖全图的操作返回None，不能分块执行
+        """
+        return None
+
+    def pointwise(self):
+        """
+        逐像素操作的描述，用于把连续的逐像素操作合并为一次查表(core.fusion)
+        :return: (是否先转为灰度, 作用于uint8各通道的256项查找表或None)，
+                 不是逐像素操作或结果依赖全图时返回None
+        """
+        return None
+
+    def accepts_gray(self):
+        """
+        能否直接处理单通道图像，结果与处理三个通道相等的BGR图像一致
+        单通道图像在各级之间保持单通道，只有遇到不能处理它的操作时才扩展为BGR
+        """
+        return True
+
+    def __call__(self, img):
+        """执行操作，输入为单通道而操作需要彩色图像时先扩展为BGR"""
+        if img.ndim == 2 and not self.accepts_gray():
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return self.process(img)
+
+    @abstractmethod
+    def process(self, img):
+        """执行操作，由子类实现，输出可以是单通道(灰度)或BGR图像"""
+
+
+def fingerprint(stage):
+    """计算操作的参数指纹: (类型名, 按键排序的参数元组)"""
+    params = stage.get_params()
+    return type(stage).__name__, tuple(sorted(params.items()))
+
+
+def scale_pixels(value, scale, odd=False):
+    """
+    按比例缩放像素单位的参数，0和负值(通常表示自动或不限制)保持不变
+    odd为None时按实数缩放，否则缩放后取整且至少为1，odd为True时保持奇数
+    """
+    if value <= 0:
+        return value
+    if odd is None:
+        return value * scale
+    value = max(1, int(round(value * scale)))
+    if odd and value % 2 == 0:
+        value += 1
+    return value
+
+
+class Graying(Operation):
+    """图像灰度化操作"""
+    def __init__(self):
+        self._mode = BGR2GRAY_COLOR  # 灰度化模式
+
+    def halo(self):
+        return 0
+
+    def pointwise(self):
+        return True, None
+
+    def process(self, img):
+        """
+        执行灰度化处理
+        输出单通道灰度图，显示或后续操作需要时再扩展为BGR
+        """
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        return img
+
+
+class Filter(Operation):
+    """图像滤波操作，支持多种滤波方式"""
+    # 高斯滤波的标准差也以像素为单位，为0时由核大小自动计算，不缩放
+    spatial_params = {'ksize': True, 'sigmax': None}
+
+    def __init__(self):
+        self._ksize = 3        # 核大小
+        self._kind = MEAN_FILTER  # 滤波类型
+        self._sigmax = 0       # 高斯滤波标准差
+
+    def halo(self):
+        return self._ksize // 2
+
+    def process(self, img):
+        """根据不同的滤波类型执行相应的平滑处理"""
+        if self._kind == MEAN_FILTER:
+            img = cv2.blur(img, (self._ksize, self._ksize))  # 均值滤波
+        elif self._kind == GAUSSIAN_FILTER:
+            img = cv2.GaussianBlur(img, (self._ksize, self._ksize), self._sigmax)  # 高斯滤波
+        elif self._kind == MEDIAN_FILTER:
+            img = cv2.medianBlur(img, self._ksize)  # 中值滤波
+        return img
+
+
+class Morph(Operation):
+    """图像形态学操作"""
+    spatial_params = {'ksize': True}
+
+    def __init__(self):
+        self._ksize = 3           # 结构元素大小
+        self._op = ERODE_MORPH_OP  # 形态学操作类型
+        self._kshape = RECT_MORPH_SHAPE  # 结构元素形状
+
+    def halo(self):
+        """开、闭、顶帽、黑帽操作包含腐蚀和膨胀两次邻域运算"""
+        passes = 2 if self._op in (OPEN_MORPH_OP, CLOSE_MORPH_OP, TOPHAT_MORPH_OP, BLACKHAT_MORPH_OP) else 1
+        return self._ksize // 2 * passes
+
+    def process(self, img):
+        """执行形态学操作，如腐蚀、膨胀等"""
+        op = MORPH_OP[self._op]
+        kshape = MORPH_SHAPE[self._kshape]
+        kernal = artifacts.get(('morph_kernel', kshape, self._ksize),
+                               lambda: cv2.getStructuringElement(kshape, (self._ksize, self._ksize)))
+        img = cv2.morphologyEx(img, self._op, kernal)
+        return img
+
+
+class Grad(Operation):
+    """图像梯度计算操作"""
+
+    def __init__(self):
+        self._kind = SOBEL_GRAD  # 梯度计算方法
+        self._ksize = 3          # 核大小
+        self._dx = 1             # x方向导数阶数
+        self._dy = 0             # y方向导数阶数
+
+    def halo(self):
+        """ksize为1的Sobel算子和Laplacian算子使用3x3的核"""
+        if not self.is_valid():
+            return 0
+        if self._kind == SOBEL_GRAD:
+            return max(1, self._ksize // 2)
+        return 1
+
+    def is_valid(self):
+        """dx和dy同时为0时只有拉普拉斯算子有效"""
+        return not (self._dx == 0 and self._dy == 0 and self._kind != LAPLACIAN_GRAD)
+
+    def process(self, img):
+        """
+        计算图像梯度
+        参数无效时原样返回
+        """
+        if self.is_valid():
+            if self._kind == SOBEL_GRAD:
+                img = cv2.Sobel(img, -1, self._dx, self._dy, self._ksize)  # Sobel算子
+            elif self._kind == SCHARR_GRAD:
+                img = cv2.Scharr(img, -1, self._dx, self._dy)  # Scharr算子
+            elif self._kind == LAPLACIAN_GRAD:
+                img = cv2.Laplacian(img, -1)  # 拉普拉斯算子
+        return img
+
+
+class Threshold(Operation):
+    """图像阈值操作"""
+    def __init__(self):
+        self._thresh = 127         # 阈值
+        self._maxval = 255         # 最大值
+        self._method = BINARY_THRESH_METHOD  # 阈值方法
+
+    def halo(self):
+        """大津算法的阈值由全图直方图决定"""
+        return None if self._method == OTSU_THRESH_METHOD else 0
+
+    def pointwise(self):
+        """先转为灰度，再对灰度查表"""
+        if self._method == OTSU_THRESH_METHOD:
+            return None
+        method = THRESH_METHOD[self._method]
+        return True, artifacts.get(('threshold', self._thresh, method),
+                                   lambda: cv2.threshold(RAMP, self._thresh, self._thresh, method)[1].reshape(256))
+
+    def process(self, img):
+        """
+        执行阈值处理
+        先转为灰度图，输出单通道结果
+        """
+        method = THRESH_METHOD[self._method]
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        return cv2.threshold(img, self._thresh, self._thresh, method)[1]
+
+
+class Edge(Operation):
+    """Canny边缘检测操作"""
+    def __init__(self):
+        self._thresh1 = 20  # 第一个阈值
+        self._thresh2 = 100  # 第二个阈值
+
+    def process(self, img):
+        """执行Canny边缘检测，输出单通道边缘图"""
+        return cv2.Canny(img, threshold1=self._thresh1, threshold2=self._thresh2)
+
+
+class Equalize(Operation):
+    """图像直方图均衡化操作"""
+    def __init__(self):
+        self._blue = True   # 是否均衡化蓝色通道
+        self._green = True  # 是否均衡化绿色通道
+        self._red = True    # 是否均衡化红色通道
+
+    def accepts_gray(self):
+        """只有三个通道的选项相同时，灰度图的三个通道才仍然相等"""
+        return self._blue == self._green == self._red
+
+    def process(self, img):
+        """
+        对选定的通道执行直方图均衡化
+        分别处理RGB三个通道，然后合并
+        """
+        if img.ndim == 2:
+            return cv2.equalizeHist(img) if self._blue else img
+        b, g, r = cv2.split(img)
+        if self._blue:
+            b = cv2.equalizeHist(b)
+        if self._green:
+            g = cv2.equalizeHist(g)
+        if self._red:
+            r = cv2.equalizeHist(r)
+        return cv2.merge((b, g, r))
+
+
+class HoughLine(Operation):
+    """霍夫直线检测操作"""
+    # 累加器阈值是直线上的像素数，也随图像尺寸缩放
+    spatial_params = {'min_length': False, 'max_gap': False, 'thresh': False}
+
+    def __init__(self):
+        self._rho = 1             # 距离分辨率
+        self._theta = np.pi / 180  # 角度分辨率
+        self._thresh = 80         # 阈值
+        self._min_length = 200    # 最小线段长度
+        self._max_gap = 15        # 最大线段间隙
+
+    def process(self, img):
+        """
+        执行霍夫直线检测
+        先转为灰度图，检测后在原图上绘制绿色直线
+        """
+        img_gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        lines = cv2.HoughLinesP(img_gray, self._rho, self._theta, self._thresh, 
+                               minLineLength=self._min_length, maxLineGap=self._max_gap)
+        img_result = cv2.cvtColor(img_gray, cv2.COLOR_GRAY2BGR)
+        if lines is None: return img_result  # 没有检测到直线时直接返回
+        for line in lines:
+            for x1, y1, x2, y2 in line:
+                img_result = cv2.line(img_result, (x1, y1), (x2, y2), (0, 255, 0), thickness=2)
+        return img_result
+
+
+class Light(Operation):
+    """图像亮度调节操作"""
+    def __init__(self):
+        self._alpha = 1  # 对比度控制
+        self._beta = 0   # 亮度控制
+
+    def halo(self):
+        return 0
+
+    def pointwise(self):
+        return False, self.table()
+
+    @staticmethod
+    def weighted(img, alpha, beta):
+        """使用addWeighted函数实现: dst = src1*alpha + src2*(1-alpha) + beta，src2为全零图像"""
+        blank = np.zeros(img.shape, img.dtype)
+        return cv2.addWeighted(img, alpha, blank, 1 - alpha, beta)
+
+    def table(self):
+        """对0~255的灰度阶执行同样的运算得到查找表，与逐像素计算的舍入完全一致"""
+        return artifacts.get(('light', self._alpha, self._beta),
+                             lambda: self.weighted(RAMP, self._alpha, self._beta).reshape(256))
+
+    def process(self, img):
+        """
+        调整图像亮度和对比度
+        8位图像直接查表，不再分配整幅的全零图像
+        """
+        if img.dtype == np.uint8:
+            return cv2.LUT(img, self.table())
+        return self.weighted(img, self._alpha, self._beta)
+
+
+class Gamma(Operation):
+    """图像伽马校正操作，用于调整亮度和对比度"""
+    def __init__(self):
+        self._gamma = 1  # 伽马值
+
+    def halo(self):
+        return 0
+
+    def pointwise(self):
+        return False, self.table()
+
+    def table(self):
+        """伽马校正的查找表: I_out = 255 * (I_in/255)^γ"""
+        return artifacts.get(('gamma', self._gamma),
+                             lambda: np.round(np.power(np.arange(256) / 255.0, self._gamma) * 255.0).astype(np.uint8))
+
+    def process(self, img):
+        """
+        执行伽马校正
+        通过查找表(LUT)快速应用非线性变换: I_out = 255 * (I_in/255)^γ
+        """
+        return cv2.LUT(img, self.table())
+
+
+class SaltAndPepper(Operation):
+    """椒盐噪声添加操作"""
+    def __init__(self):
+        self._noise_ratio = 0.05  # 噪声比例
+        self._salt_vs_pepper = 0.5  # 盐噪声与椒噪声的比例
+        self._seed = 0  # 随机种子，参数相同时结果相同，可以被缓存
+
+    def process(self, img):
+        """
+        添加椒盐噪声
+        用带种子的随机数生成器一次性生成所有噪声点的位置，设置为白色(盐)或黑色(椒)
+        """
+        output = img.copy()
+        total_pixels = img.shape[0] * img.shape[1]
+        num_salt = int(total_pixels * self._noise_ratio * self._salt_vs_pepper)  # 盐噪声数量
+        num_pepper = int(total_pixels * self._noise_ratio * (1.0 - self._salt_vs_pepper))  # 椒噪声数量
+
+        rng = np.random.default_rng(self._seed)
+        pixels = output.reshape(total_pixels, -1)  # 每行是一个像素的所有通道
+        pixels[rng.integers(0, total_pixels, num_salt)] = 255  # 添加盐噪声（白点）
+        pixels[rng.integers(0, total_pixels, num_pepper)] = 0  # 添加椒噪声（黑点）
+        return output
+
+
+# 按类名索引的全部操作，用于流水线的序列化
+OPERATIONS = {op.__name__: op for op in (
+    Graying, Filter, Morph, Grad, Threshold, Edge, Equalize, HoughLine, Light, Gamma, SaltAndPepper,
+)}
@@ -0,0 +1,213 @@
+"""
+图像处理流水线的求值、逐级结果缓存与序列化
+本模块不依赖Qt，操作项只需可调用并提供get_params()
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from core.fusion import compile_stages
+from core.operations import OPERATIONS, fingerprint
+from core.tiling import chain_halo, pad_rect
+
+PIPELINE_VERSION = 1  # 保存的处理流程的格式版本
+ROI_PAD_STEP = 32  # 选区的边框宽度取该值的整数倍，调整核大小时边框通常不变，可以复用缓存
+
+
+def chain_keys(source_key, stages):
+    """
+    计算每一级输出的缓存键
+    第i级的键由第i-1级的键和第i级的参数指纹组成，
+    因此某一级的参数或位置变化只会改变它及其后各级的键
+    """
+    keys = []
+    key = source_key
+    for stage in stages:
+        key = (key, fingerprint(stage))
+        keys.append(key)
+    return keys
+
+
+def result_key(source_key, stages):
+    """整条操作链输出的缓存键，没有操作时为原图的标识"""
+    return chain_keys(source_key, stages)[-1] if stages else source_key
+
+
+class StageCache:
+    """
+    逐级中间结果缓存
+    按字节数限制内存占用，超出上限时按LRU淘汰中间缓冲区
+    后台处理线程与界面线程会同时访问，内部状态由锁保护
+    """
+
+    def __init__(self, max_bytes, executor=None, results=None):
+        self.max_bytes = max_bytes  # 内存上限(字节)
+        self.executor = executor  # 可选的分块执行器(core.tiling.TileExecutor)
+        self.results = results  # 可选的磁盘结果缓存(core.resultcache.ResultCache)，只缓存整条操作链的结果
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # 缓存键 -> 输出图像
+        self._bytes = 0  # 当前占用
+        self._keys = []  # 最近一次求值时各位置的键
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key):
+        """读取缓存，命中时移到LRU队尾"""
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+            return img
+
+    def put(self, key, img):
+        """写入缓存并按上限淘汰最久未使用的结果"""
+        if img.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = img
+            self._bytes += img.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def discard(self, key):
+        with self._lock:
+            img = self._entries.pop(key, None)
+            if img is not None:
+                self._bytes -= img.nbytes
+
+    def invalidate(self, start=0):
+        """丢弃最近一次求值中第start级及其后的结果(拖动排序、删除操作时调用)"""
+        with self._lock:
+            for key in self._keys[start:]:
+                self.discard(key)
+            del self._keys[start:]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._keys = []
+
+    def run(self, src, source_key, stages, cancelled=None, profile=None, source_path=None, persist=False):
+        """
+        增量求值：从最后一个命中缓存的位置之后开始计算
+        :param src: 原始图像
+        :param source_key: 原始图像的标识，原图变化时必须随之变化
+        :param stages: 按顺序排列的操作项
+        :param cancelled: 可选的回调，在两级操作之间调用，返回True时放弃本次求值
+        :param profile: 可选的core.profiling.RunProfile，记录各段的耗时和输出
+        :param source_path: src是该文件完整解码的结果时给出，用于读取磁盘结果缓存
+        :param persist: 是否把新计算的结果写入磁盘结果缓存(需要source_path)，在后台线程中写入，
+                        只用于停止编辑后的渲染和导出，交互编辑的中间结果不写入
+        :return: 最后一级的输出，被取消时返回None
+        """
+        keys = chain_keys(source_key, stages)
+        with self._lock:
+            self._keys = keys
+        img, start = src, 0
+        # 从后往前找到第一个仍然有效的中间结果
+        for i in range(len(keys) - 1, -1, -1):
+            cached = self.get(keys[i])
+            if cached is not None:
+                img, start = cached, i + 1
+                break
+        use_disk = self.results is not None and source_path is not None and stages
+        if use_disk and start < len(stages):
+            cached = self.results.get(source_path, stages)
+            if cached is not None:
+                self.put(keys[-1], cached)
+                img, start = cached, len(stages)
+        if profile is not None:
+            profile.cached(stages, start)
+        # 连续的逐像素操作合并为一次查表，ends[k]为第k个合并后操作的第一级在原操作链中的位置
+        ops, ends = [], [start]
+        for n, op in compile_stages(stages[start:]):
+            ops.append(op)
+            ends.append(ends[-1] + n)
+        k = 0
+        while k < len(ops):
+            if cancelled is not None and cancelled():
+                return None
+            begin = time.perf_counter() if profile is not None else 0
+            n = self.executor.run_length(ops, k, img) if self.executor is not None else 0
+            if n:
+                # 连续的可分块操作逐块一次完成
+                img = self.executor.run(img, ops[k:k + n])
+            else:
+                img = ops[k](img)
+                n = 1
+            if profile is not None:
+                profile.record(ends[k], stages[ends[k]:ends[k + n]], begin, img)
+            k += n
+            # 合并或分块执行的一段只缓存最后一级的结果
+            self.put(keys[ends[k] - 1], img)
+        if use_disk and persist and ops:
+            self.results.put_async(source_path, stages, img)
+        if profile is not None:
+            profile.finish()
+        return img
+
+    def run_region(self, src, source_key, stages, rect, cancelled=None, profile=None):
+        """
+        只处理选区：选区向外扩展一圈边框(各级邻域半径之和)后裁剪出来增量求值，再去掉边框，
+        结果与整图处理后取同一区域逐像素一致。裁剪区域作为独立的源参与逐级缓存
+        :param rect: 选区(y0, y1, x0, x1)，已限制在src内
+        :return: (结果, rect)；操作链含有依赖全图的操作时处理整图，返回(整图结果, None)；被取消时结果为None
+        """
+        halo = chain_halo(stages)
+        if halo is None:
+            return self.run(src, source_key, stages, cancelled, profile), None
+        pad = -(-halo // ROI_PAD_STEP) * ROI_PAD_STEP
+        h, w = src.shape[:2]
+        py0, py1, px0, px1 = padded = pad_rect(rect, pad, h, w)
+        img = self.run(src[py0:py1, px0:px1], (source_key, padded), stages, cancelled, profile)
+        if img is None:
+            return None, rect
+        y0, y1, x0, x1 = rect
+        return img[y0 - py0:y1 - py0, x0 - px0:x1 - px0], rect
+
+
+def run_pipeline(img, stages, executor=None):
+    """不使用缓存依次执行整条操作链(批处理时使用)"""
+    return StageCache(0, executor).run(img, None, stages)
+
+
+def dump_pipeline(stages):
+    """把操作链转换为可以写成JSON的字典: 每一级记录操作类型和参数"""
+    return {
+        'version': PIPELINE_VERSION,
+        'stages': [{'type': type(stage).__name__, 'params': stage.get_params()} for stage in stages],
+    }
+
+
+def build_pipeline(data):
+    """由dump_pipeline的结果重建操作链"""
+    stages = []
+    for entry in data['stages']:
+        operation = OPERATIONS.get(entry['type'])
+        if operation is None:
+            raise ValueError('未知的操作类型: %s' % entry['type'])
+        stage = operation()
+        stage.update_params(entry.get('params', {}))
+        stages.append(stage)
+    return stages
+
+
+def save_pipeline(path, stages):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dump_pipeline(stages), f, ensure_ascii=False, indent=2)
+
+
+def load_pipeline(path):
+    with open(path, encoding='utf-8') as f:
+        return build_pipeline(json.load(f))
@@ -0,0 +1,85 @@
+"""
+处理流水线的性能记录
+每次求值记录各级(或合并、分块执行的一段)的耗时、输出形状、类型和输出缓冲区字节数，
+可以导出为Chrome trace格式(chrome://tracing 或 Perfetto 打开)离线分析
+不记录时StageCache.run只多一次判断，几乎没有额外开销
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+# 一段连续操作的记录：第一级的位置、级数、名称、开始时间、耗时(秒)、输出形状、类型、字节数、是否取自缓存、线程
+StageRecord = namedtuple('StageRecord', 'first count name start seconds shape dtype nbytes cached thread')
+
+
+class RunProfile:
+    """一次求值的性能记录"""
+
+    def __init__(self, scale=1.0):
+        """:param scale: 处理的图像相对原图的缩放比例，预览时小于1"""
+        self.scale = scale
+        self.records = []
+        self.start = time.perf_counter()
+        self.seconds = None  # 处理总耗时，求值结束时设置
+        self.display_start = None
+        self.display_seconds = None  # 显示转换耗时，由界面设置
+
+    def cached(self, stages, count):
+        """前count级取自缓存"""
+        now = time.perf_counter()
+        for i in range(count):
+            self.records.append(StageRecord(i, 1, type(stages[i]).__name__, now, 0.0, None, None, 0, True,
+                                            threading.get_ident()))
+
+    def record(self, first, stages, start, img):
+        """记录从第first级开始的一段操作，start为开始时间，img为输出"""
+        name = '+'.join(type(stage).__name__ for stage in stages)
+        self.records.append(StageRecord(first, len(stages), name, start, time.perf_counter() - start,
+                                        img.shape, str(img.dtype), img.nbytes, False, threading.get_ident()))
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start
+
+    def set_display(self, start, seconds):
+        self.display_start, self.display_seconds = start, seconds
+
+    def per_stage(self, count):
+        """每一级对应的记录(合并执行的各级共享同一条记录)，没有记录的为None"""
+        result = [None] * count
+        for record in self.records:
+            for i in range(record.first, min(record.first + record.count, count)):
+                result[i] = record
+        return result
+
+
+def chrome_trace(profiles):
+    """转换为Chrome trace的事件列表，时间以第一次求值的开始为零点(微秒)"""
+    if not profiles:
+        return {'traceEvents': []}
+    origin = min(profile.start for profile in profiles)
+    us = lambda t: round((t - origin) * 1e6, 1)
+    pid = os.getpid()
+    events = []
+    for n, profile in enumerate(profiles):
+        if profile.seconds is not None:
+            events.append({'name': 'pipeline #%d (scale %g)' % (n, profile.scale), 'ph': 'X', 'cat': 'pipeline',
+                           'ts': us(profile.start), 'dur': round(profile.seconds * 1e6, 1), 'pid': pid,
+                           'tid': profile.records[0].thread if profile.records else 0})
+        for record in profile.records:
+            if record.cached:
+                continue
+            events.append({'name': record.name, 'ph': 'X', 'cat': 'stage', 'ts': us(record.start),
+                           'dur': round(record.seconds * 1e6, 1), 'pid': pid, 'tid': record.thread,
+                           'args': {'stages': '%d-%d' % (record.first, record.first + record.count - 1),
+                                    'shape': list(record.shape), 'dtype': record.dtype, 'bytes': record.nbytes}})
+        if profile.display_seconds is not None:
+            events.append({'name': 'display', 'ph': 'X', 'cat': 'display', 'ts': us(profile.display_start),
+                           'dur': round(profile.display_seconds * 1e6, 1), 'pid': pid, 'tid': 'gui'})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def save_chrome_trace(path, profiles):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(chrome_trace(profiles), f)
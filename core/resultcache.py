@@ -0,0 +1,121 @@
+"""
+按内容寻址的处理结果磁盘缓存
+缓存键由源文件内容的哈希和操作链的规范指纹(各级的类型名和参数)组成，
+与文件路径和修改时间无关：同一份图像复制到别处、重新打开昨天编辑过的图像、
+对同一批文件重复运行同一流程时，直接读取上次的结果
+结果按NumPy格式无损保存，保留原有的位深和通道数
+界面(原始分辨率的处理结果)和批处理(core.batch)共用
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.diskcache import DiskCache
+from core.imageio import map_file
+from core.pipeline import PIPELINE_VERSION, dump_pipeline
+
+CACHE_VERSION = 1  # 缓存文件格式的版本，格式改变后旧的缓存自动失效
+HASH_CHUNK = 16 * 1024 * 1024  # 计算文件哈希时每次读取的字节数
+DEFAULT_CACHE_BYTES = 2 * 1024 * 1024 * 1024  # 默认的缓存总大小上限
+
+
+def file_digest(path):
+    """文件内容的SHA-1，空文件也有确定的结果"""
+    digest = hashlib.sha1()
+    buf = map_file(path)
+    if buf is not None:
+        for start in range(0, len(buf), HASH_CHUNK):
+            digest.update(buf[start:start + HASH_CHUNK])
+    return digest.hexdigest()
+
+
+def pipeline_fingerprint(stages):
+    """操作链的规范指纹：按键排序的JSON，参数相同的操作链结果相同"""
+    data = dump_pipeline(stages)
+    return json.dumps([PIPELINE_VERSION, data['stages']], sort_keys=True, ensure_ascii=True)
+
+
+class ResultCache(DiskCache):
+    """磁盘上的处理结果缓存，可在多个线程、多个进程中同时使用"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES, max_digests=4096):
+        """
+        :param directory: 缓存目录
+        :param max_bytes: 缓存文件总大小的上限
+        :param max_digests: 在内存中记住的文件哈希数，文件未修改时不必重新计算
+        """
+        super(ResultCache, self).__init__(directory, max_bytes)
+        self.max_digests = max_digests
+        self._digests = OrderedDict()  # (路径, 修改时间, 大小) -> 内容哈希
+        self._digest_lock = threading.Lock()
+        self._writer = None  # 后台写入线程，第一次put_async时创建
+
+    def source_digest(self, path):
+        """源文件内容的哈希，文件不存在时返回None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = os.path.abspath(path), st.st_mtime_ns, st.st_size
+        with self._digest_lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+        try:
+            digest = file_digest(path)
+        except OSError:
+            return None
+        with self._digest_lock:
+            self._digests[key] = digest
+            if len(self._digests) > self.max_digests:
+                self._digests.popitem(last=False)
+        return digest
+
+    def cache_path(self, path, stages):
+        """源文件和操作链对应的缓存文件路径，源文件不存在时返回None"""
+        digest = self.source_digest(path)
+        if digest is None:
+            return None
+        key = '%d|%s|%s' % (CACHE_VERSION, digest, pipeline_fingerprint(stages))
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name + '.npy')
+
+    def get(self, path, stages):
+        """读取缓存的处理结果，没有时返回None"""
+        cached = self.cache_path(path, stages)
+        if cached is None:
+            return None
+        try:
+            img = np.load(cached, allow_pickle=False)
+        except (OSError, ValueError):
+            return None  # 不存在、已被其它进程淘汰或已损坏
+        self.touch(cached)
+        return img
+
+    def put(self, path, stages, img):
+        """写入处理结果，已有同一结果时只更新使用时间，写入失败时只是不缓存"""
+        if img.nbytes > self.max_bytes:
+            return
+        cached = self.cache_path(path, stages)
+        if cached is None:
+            return
+        if os.path.exists(cached):
+            self.touch(cached)
+            return
+        self.write(cached, lambda tmp: np.save(tmp, np.ascontiguousarray(img), allow_pickle=False))
+
+    def put_async(self, path, stages, img):
+        """
+        在后台线程中依次写入处理结果，立即返回，调用方不必等待哈希计算和文件写入
+        img和stages在写入完成前不能再被修改
+        """
+        with self._digest_lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(1, thread_name_prefix='result-cache')
+        return self._writer.submit(self.put, path, stages, img)
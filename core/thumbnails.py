@@ -0,0 +1,80 @@
+"""
+缩略图生成与磁盘缓存
+- 按缩小倍数解码(cv2.IMREAD_REDUCED_*)，JPEG解码时直接跳过大部分数据
+- 缓存文件以(路径, 修改时间, 文件大小, 缩略图尺寸)的哈希命名，源文件改变后自动失效
+- 缓存总大小有上限，超出后删除最久未使用的文件；写入先写临时文件再原子替换
+"""
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+from core.diskcache import DiskCache
+from core.imageio import read_image, read_reduced, write_image
+
+
+# 缩略图统一为8位BGR: 通道数 -> 转换方式
+THUMBNAIL_CONVERSIONS = {1: cv2.COLOR_GRAY2BGR, 4: cv2.COLOR_BGRA2BGR}
+
+
+def make_thumbnail(path, size):
+    """生成长边不超过size的8位BGR缩略图，按尽量大的缩小倍数解码，无法解码时返回None"""
+    img, _ = read_reduced(path, size)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    ratio = size / max(h, w)
+    if ratio < 1:
+        img = cv2.resize(img, (max(1, round(w * ratio)), max(1, round(h * ratio))), interpolation=cv2.INTER_AREA)
+    if img.dtype == np.uint16:
+        img = (img >> 8).astype(np.uint8)  # 16位图像取高8位
+    elif img.dtype != np.uint8:
+        img = cv2.convertScaleAbs(img)
+    code = THUMBNAIL_CONVERSIONS.get(1 if img.ndim == 2 else img.shape[2])
+    return cv2.cvtColor(img, code) if code is not None else img
+
+
+class ThumbnailCache(DiskCache):
+    """磁盘上的缩略图缓存，可在多个线程中同时使用"""
+
+    def __init__(self, directory, size=96, max_bytes=256 * 1024 * 1024):
+        """
+        :param directory: 缓存目录
+        :param size: 缩略图长边的像素数
+        :param max_bytes: 缓存文件总大小的上限
+        """
+        super(ThumbnailCache, self).__init__(directory, max_bytes)
+        self.size = size
+
+    def cache_path(self, path):
+        """源文件对应的缓存文件路径，源文件不存在时返回None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = '%s|%d|%d|%d' % (os.path.abspath(path), st.st_mtime_ns, st.st_size, self.size)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.jpg')
+
+    def get(self, path):
+        """
+        获取源文件的缩略图，缓存中没有时生成并写入缓存
+        :return: BGR图像，无法解码时返回None
+        """
+        cached = self.cache_path(path)
+        if cached is None:
+            return None
+        if os.path.exists(cached):
+            img = read_image(cached, cv2.IMREAD_COLOR)
+            if img is not None:
+                self.touch(cached)
+                return img
+        img = make_thumbnail(path, self.size)
+        if img is not None:
+            self.put(cached, img)
+        return img
+
+    def put(self, cached, img):
+        """原子地写入缓存文件，写入失败时只是不缓存"""
+        self.write(cached, lambda tmp: write_image(tmp, img, [cv2.IMWRITE_JPEG_QUALITY, 85]))
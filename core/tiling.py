@@ -0,0 +1,130 @@
+"""
+分块多线程执行邻域操作
+图像按块切分，每块向外扩展一圈边框(halo)，宽度为连续各级操作的邻域半径之和，
+各块在线程池中独立完成连续的多级操作后拼接，结果与整图处理逐像素一致
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def stage_halo(stage):
+    """
+    操作的邻域半径
+    :return: 输出像素只依赖输入中该半径内的像素时返回半径(逐像素操作为0)，
+             依赖全图统计或全局传播的操作(直方图均衡化、Canny滞后连接等)返回None
+    """
+    halo = getattr(stage, 'halo', None)
+    return halo() if halo is not None else None
+
+
+def chain_halo(stages):
+    """连续多级操作的总邻域半径，含有依赖全图的操作时返回None"""
+    total = 0
+    for stage in stages:
+        halo = stage_halo(stage)
+        if halo is None:
+            return None
+        total += halo
+    return total
+
+
+def pad_rect(rect, halo, height, width):
+    """范围(y0, y1, x0, x1)向外扩展halo后与图像求交"""
+    y0, y1, x0, x1 = rect
+    return max(0, y0 - halo), min(height, y1 + halo), max(0, x0 - halo), min(width, x1 + halo)
+
+
+# 贴图前把底图转换为与贴入区域相同的通道数: (底图通道数, 区域通道数) -> 转换方式
+CHANNEL_CONVERSIONS = {
+    (3, 1): cv2.COLOR_BGR2GRAY, (4, 1): cv2.COLOR_BGRA2GRAY,
+    (1, 3): cv2.COLOR_GRAY2BGR, (4, 3): cv2.COLOR_BGRA2BGR,
+    (1, 4): cv2.COLOR_GRAY2BGRA, (3, 4): cv2.COLOR_BGR2BGRA,
+}
+
+
+def channels(img):
+    return img.shape[2] if img.ndim == 3 else 1
+
+
+def composite(base, region, rect):
+    """
+    把region贴到base的rect(y0, y1, x0, x1)处，返回新图像
+    base先转换为与region相同的通道数和数据类型(如操作链中有灰度化)
+    """
+    code = CHANNEL_CONVERSIONS.get((channels(base), channels(region)))
+    out = cv2.cvtColor(base, code) if code is not None else base.copy()
+    if out.dtype != region.dtype:
+        out = out.astype(region.dtype)
+    y0, y1, x0, x1 = rect
+    out[y0:y1, x0:x1] = region
+    return out
+
+
+class TileExecutor:
+    """分块执行器，在线程池中按块执行连续的可分块操作"""
+
+    def __init__(self, tile_size=512, workers=None, min_pixels=0):
+        """
+        :param tile_size: 块的边长(不含边框)
+        :param workers: 线程数，默认为CPU核数
+        :param min_pixels: 图像像素数不小于该值时才分块，小图整图处理更快
+        """
+        self.tile_size = tile_size
+        self.workers = workers or os.cpu_count() or 1
+        self.min_pixels = min_pixels
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='tile')
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def run_length(self, stages, start, img):
+        """从start开始连续可分块的操作数，图像太小时返回0"""
+        if img.shape[0] * img.shape[1] < self.min_pixels:
+            return 0
+        n = 0
+        for stage in stages[start:]:
+            if stage_halo(stage) is None:
+                break
+            n += 1
+        return n
+
+    def tiles(self, height, width):
+        """按行优先顺序生成块的范围(y0, y1, x0, x1)"""
+        for y0 in range(0, height, self.tile_size):
+            for x0 in range(0, width, self.tile_size):
+                yield y0, min(y0 + self.tile_size, height), x0, min(x0 + self.tile_size, width)
+
+    def run(self, img, stages):
+        """
+        分块执行连续的多级操作，每块在缓存仍热时依次完成所有操作
+        :param stages: 均可分块的操作
+        :return: 与整图依次执行各级操作相同的结果
+        """
+        halo = chain_halo(stages)
+        h, w = img.shape[:2]
+
+        def process(rect):
+            y0, y1, x0, x1 = rect
+            py0, py1, px0, px1 = pad_rect(rect, halo, h, w)
+            tile = img[py0:py1, px0:px1]
+            for stage in stages:
+                tile = stage(tile)
+            return rect, tile[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+
+        out = None
+        for (y0, y1, x0, x1), tile in self.pool.map(process, self.tiles(h, w)):
+            if out is None:
+                out = np.empty((h, w) + tile.shape[2:], tile.dtype)
+            out[y0:y1, x0:x1] = tile
+        return out
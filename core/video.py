@@ -0,0 +1,301 @@
+"""
+视频流处理
+解码、处理、输出(显示或编码)分别在独立的线程中进行，线程之间用有界队列连接
+- 实时播放(VideoStream)：按视频帧率解码，处理跟不上时丢弃最旧的帧，延迟不会累积
+- 离线导出(export_video)：不丢帧，多个线程并行处理各帧，按原顺序写入cv2.VideoWriter
+每个环节统计处理的帧数和忙碌时间，得到各环节单独的帧率
+"""
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from core.pipeline import run_pipeline
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')  # 支持的视频格式
+FOURCC = {'.mp4': 'mp4v', '.avi': 'MJPG', '.mov': 'mp4v', '.mkv': 'XVID'}  # 导出时按扩展名选择编码
+
+_END = object()  # 队列中表示视频结束的标记
+
+
+def is_video_file(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+class StageMeter:
+    """一个环节的统计：帧数、忙碌时间、丢弃的帧数"""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy = 0.0
+        self.dropped = 0
+
+    def add(self, seconds):
+        self.frames += 1
+        self.busy += seconds
+
+    @property
+    def fps(self):
+        """只计忙碌时间的帧率，即该环节单独能达到的处理速度"""
+        return self.frames / self.busy if self.busy else 0.0
+
+    def __repr__(self):
+        return '%s: %d帧 %.1ffps 丢弃%d' % (self.name, self.frames, self.fps, self.dropped)
+
+
+def put_latest(q, item, meter):
+    """放入队列，队列已满时丢弃最旧的一项"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+                meter.dropped += 1
+            except queue.Empty:
+                pass
+
+
+def open_capture(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError('无法打开视频: %s' % path)
+    return capture
+
+
+class VideoStream:
+    """
+    实时播放：按视频帧率解码并处理每一帧，处理结果交给sink(帧序号, 图像)
+    sink在输出线程中调用，界面需要自行转回界面线程
+    操作链处理某一帧出错时停止播放，异常交给on_error(异常)
+    """
+
+    def __init__(self, path, stages, sink, executor=None, queue_size=2, loop=False, on_error=None):
+        """
+        :param stages: 操作链，可以在播放中通过set_stages替换
+        :param executor: 可选的分块执行器(core.tiling.TileExecutor)
+        :param queue_size: 各环节之间队列的长度，越小延迟越低
+        :param loop: 播放结束后是否从头重新播放
+        :param on_error: 处理出错时在处理线程中调用on_error(异常)，随后各线程结束
+        """
+        self.path = path
+        self.stages = stages
+        self.sink = sink
+        self.on_error = on_error
+        self.error = None  # 使播放停止的异常
+        self.executor = executor
+        self.loop = loop
+        self.meters = {name: StageMeter(name) for name in ('decode', 'process', 'display')}
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._decoded = queue.Queue(queue_size)
+        self._processed = queue.Queue(queue_size)
+        capture = open_capture(path)
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        self.frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._capture = capture
+        self._threads = [threading.Thread(target=target, name='video-' + name, daemon=True)
+                         for name, target in (('decode', self._decode), ('process', self._process),
+                                              ('display', self._display))]
+
+    def set_stages(self, stages):
+        """替换操作链，从下一帧开始生效"""
+        self.stages = stages
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """停止播放并等待各线程结束"""
+        self._stop.set()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+
+    def _get(self, q):
+        """从队列取出一项，停止时返回_END"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _decode(self):
+        meter = self.meters['decode']
+        start = time.perf_counter()
+        index = 0
+        try:
+            while not self._stop.is_set():
+                # 按帧率播放：解码得比播放快时等待，慢时不等待
+                delay = start + index / self.fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                t = time.perf_counter()
+                ok, frame = self._capture.read()
+                if not ok:
+                    if self.loop and index:
+                        self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        start, index = time.perf_counter(), 0
+                        continue
+                    break
+                meter.add(time.perf_counter() - t)
+                put_latest(self._decoded, (index, frame), meter)
+                index += 1
+        finally:
+            self._capture.release()
+            put_latest(self._decoded, _END, meter)
+
+    def _process(self):
+        meter = self.meters['process']
+        while True:
+            item = self._get(self._decoded)
+            if item is _END:
+                break
+            index, frame = item
+            t = time.perf_counter()
+            try:
+                img = run_pipeline(frame, self.stages, self.executor)
+            except Exception as e:
+                # 停止解码线程，输出线程取到结束标记后结束
+                self.error = e
+                self._stop.set()
+                if self.on_error is not None:
+                    self.on_error(e)
+                break
+            meter.add(time.perf_counter() - t)
+            put_latest(self._processed, (index, img), meter)
+        put_latest(self._processed, _END, meter)
+
+    def _display(self):
+        meter = self.meters['display']
+        while True:
+            item = self._get(self._processed)
+            if item is _END:
+                break
+            t = time.perf_counter()
+            self.sink(*item)
+            meter.add(time.perf_counter() - t)
+        self.finished.set()
+
+
+def as_bgr(img):
+    """VideoWriter按彩色打开，单通道结果扩展为BGR"""
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img
+
+
+def export_video(src, dst, stages, executor=None, workers=None, fourcc=None, progress=None, cancelled=None):
+    """
+    离线导出：处理每一帧并写入视频文件，不丢帧
+    解码和编码各占一个线程，处理由workers个线程并行，编码线程按帧序号顺序写入
+    :param fourcc: 四字符编码，默认按dst的扩展名选择
+    :param progress: 每写入一帧后调用progress(已写入帧数, 总帧数)
+    :param cancelled: 返回True时停止导出
+    :return: 各环节的统计{名称: StageMeter}
+    :raises ValueError: 无法写入dst，或未被取消却没有解码出任何一帧
+    """
+    workers = workers or os.cpu_count() or 1
+    capture = open_capture(src)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fourcc = fourcc or FOURCC.get(os.path.splitext(dst)[1].lower(), 'mp4v')
+    meters = {name: StageMeter(name) for name in ('decode', 'process', 'encode')}
+    stop = threading.Event()
+    decoded = queue.Queue(2 * workers)
+    slots = threading.Semaphore(4 * workers)  # 已解码尚未写入的帧数上限，限制重排缓冲区的大小
+    done = {}  # 帧序号 -> 处理结果，等待按顺序写入
+    done_cond = threading.Condition()
+    errors = []
+
+    def is_stopped():
+        return stop.is_set() or (cancelled is not None and cancelled())
+
+    def decode():
+        meter = meters['decode']
+        index = 0
+        try:
+            while not is_stopped():
+                t = time.perf_counter()
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                meter.add(time.perf_counter() - t)
+                slots.acquire()
+                decoded.put((index, frame))
+                index += 1
+        finally:
+            capture.release()
+            for _ in range(workers):
+                decoded.put(_END)
+            with done_cond:
+                done['count'] = index  # 总帧数
+                done_cond.notify_all()
+
+    def process():
+        meter = meters['process']
+        while True:
+            item = decoded.get()
+            if item is _END:
+                return
+            index, frame = item
+            try:
+                t = time.perf_counter()
+                img = as_bgr(run_pipeline(frame, stages, executor))
+                meter.add(time.perf_counter() - t)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+                img = None
+            with done_cond:
+                done[index] = img
+                done_cond.notify_all()
+
+    threads = [threading.Thread(target=decode, name='export-decode', daemon=True)]
+    threads += [threading.Thread(target=process, name='export-process', daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # 编码在调用线程中进行
+    meter = meters['encode']
+    writer = None
+    index = 0
+    try:
+        while True:
+            with done_cond:
+                while index not in done and done.get('count', index + 1) > index and not stop.is_set():
+                    done_cond.wait(0.1)
+                if index not in done:
+                    break
+                img = done.pop(index)
+            slots.release()
+            if img is None or is_stopped():
+                break
+            t = time.perf_counter()
+            if writer is None:
+                writer = cv2.VideoWriter(dst, cv2.VideoWriter_fourcc(*fourcc), fps, (img.shape[1], img.shape[0]))
+                if not writer.isOpened():
+                    raise ValueError('无法写入视频: %s' % dst)
+            writer.write(img)
+            meter.add(time.perf_counter() - t)
+            index += 1
+            if progress is not None:
+                progress(index, total)
+    finally:
+        stop.set()
+        # 释放可能阻塞的解码线程
+        for _ in range(4 * workers):
+            slots.release()
+        for thread in threads:
+            thread.join()
+        if writer is not None:
+            writer.release()
+    if errors:
+        raise errors[0]
+    if index == 0 and not (cancelled is not None and cancelled()):
+        raise ValueError('没有可解码的视频帧: %s' % src)
+    return meters
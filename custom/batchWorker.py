@@ -0,0 +1,43 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from core.batch import run_batch
+from core.resultcache import DEFAULT_CACHE_BYTES
+
+
+class BatchWorker(QThread):
+    """在后台线程中驱动多进程批处理，进度通过信号回到界面线程"""
+    progress = pyqtSignal(int, int, str)  # 已完成数, 总数, 当前文件
+    finished_batch = pyqtSignal(int, int, int)  # 完成数, 跳过数, 失败数
+
+    def __init__(self, pipeline, jobs, workers=None, cache_dir=None, cache_bytes=DEFAULT_CACHE_BYTES,
+                 resume=True, parent=None):
+        """
+        :param pipeline: dump_pipeline的结果
+        :param jobs: (输入路径, 输出路径)列表
+        :param cache_dir: 磁盘结果缓存的目录(core.resultcache)，None时不使用
+        :param resume: 为True时跳过已由同一流程生成的输出，为False时全部重新处理
+        """
+        super(BatchWorker, self).__init__(parent)
+        self.pipeline = pipeline
+        self.jobs = jobs
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes
+        self.resume = resume
+        self._cancelled = False
+        self._done = 0
+
+    def cancel(self):
+        """停止提交新文件，已在处理的文件完成后结束"""
+        self._cancelled = True
+
+    def on_progress(self, result):
+        self._done += 1
+        self.progress.emit(self._done, len(self.jobs), result.src)
+
+    def run(self):
+        results = run_batch(self.pipeline, self.jobs, self.workers, resume=self.resume,
+                            progress=self.on_progress, cancelled=lambda: self._cancelled,
+                            cache_dir=self.cache_dir, cache_bytes=self.cache_bytes)
+        counts = [sum(r.status == status for r in results) for status in ('done', 'skipped', 'failed')]
+        self.finished_batch.emit(*counts)
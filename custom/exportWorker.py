@@ -0,0 +1,90 @@
+import os
+import threading
+import traceback
+from collections import deque, namedtuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from core.batch import temp_path
+from core.imageio import write_image
+
+# 一次导出: 原始图像, 相对原图的缩放比例, 原图路径, 原图版本号, 操作链快照, 输出路径, 编码参数
+ExportJob = namedtuple('ExportJob', 'src scale path generation stages dst params')
+
+
+class ExportWorker(QThread):
+    """
+    在后台线程中依次导出原始分辨率的处理结果，导出期间可以继续编辑
+    处理复用逐级缓存，已渲染过原始分辨率时只需编码；首次显示的缩小图先加载原图
+    """
+    progress = pyqtSignal(int, int, str)  # 已完成数, 已提交数, 正在导出的文件
+    exported = pyqtSignal(str, str)  # 输出路径, 错误信息(成功时为空)
+
+    def __init__(self, cache, loader, parent=None):
+        """
+        :param cache: 与界面共用的逐级缓存(core.pipeline.StageCache)
+        :param loader: 加载原图的core.loader.ImageLoader
+        """
+        super(ExportWorker, self).__init__(parent)
+        self.cache = cache
+        self.loader = loader
+        self._cond = threading.Condition()
+        self._jobs = deque()
+        self._running = True
+        self._done = 0
+        self._submitted = 0
+
+    def submit(self, job):
+        """加入导出队列，立即返回"""
+        with self._cond:
+            if not self._jobs:
+                self._done = self._submitted = 0  # 队列空闲后重新计数
+            self._jobs.append(job)
+            self._submitted += 1
+            self._cond.notify()
+            done, submitted = self._done, self._submitted
+        self.progress.emit(done, submitted, job.dst)
+
+    def stop(self):
+        """完成队列中的导出后结束线程"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+
+    def export(self, job):
+        src, key = job.src, (job.generation, 1.0)
+        if job.scale < 1.0:
+            src = self.loader.get(job.path)
+            if src is None:
+                raise ValueError('无法加载原图: %s' % job.path)
+        img = self.cache.run(src, key, job.stages, source_path=job.path, persist=True)
+        os.makedirs(os.path.dirname(job.dst) or '.', exist_ok=True)
+        tmp = temp_path(job.dst)
+        try:
+            write_image(tmp, img, job.params)
+            os.replace(tmp, job.dst)  # 写完再替换，导出中途失败不会留下不完整的文件
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._jobs and self._running:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                job = self._jobs[0]
+            error = ''
+            try:
+                self.export(job)
+            except Exception as e:
+                traceback.print_exc()
+                error = '%s: %s' % (type(e).__name__, e)
+            with self._cond:
+                self._jobs.popleft()
+                self._done += 1
+                done, submitted = self._done, self._submitted
+            self.progress.emit(done, submitted, job.dst)
+            self.exported.emit(job.dst, error)
@@ -1,21 +1,228 @@
+import math
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
+import numpy as np
 
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
+from PyQt5 import sip
+
+from core.imageio import ENCODE_OPTIONS, encode_params
+
+
+# 各通道数对应的QImage格式，格式与OpenCV的内存布局一致时无需转换即可直接包装
+# ARGB32按32位整数存储，小端机器上内存顺序为B,G,R,A，与BGRA一致
+QIMAGE_FORMATS = {1: QImage.Format_Grayscale8, 3: QImage.Format_BGR888}
+if sys.byteorder == 'little':
+    QIMAGE_FORMATS[4] = QImage.Format_ARGB32
+# 显示前扩展为BGRA的通道数，4通道图像带透明度，仍按ARGB32包装
+DISPLAY_CONVERSIONS = {1: cv2.COLOR_GRAY2BGRA, 3: cv2.COLOR_BGR2BGRA}
+
+
+def to_uint8(img):
+    """转换为8位图像用于显示，16位图像取高8位，其它类型饱和截断"""
+    if img.dtype == np.uint8:
+        return img
+    if img.dtype == np.uint16:
+        return (img >> 8).astype(np.uint8)
+    return cv2.convertScaleAbs(img)
+
+
+def wrap_qimage(img, fmt):
+    """用QImage包装数组的内存，返回的QImage通过_buffer属性持有数组"""
+    h, w = img.shape[:2]
+    image = QImage(sip.voidptr(img.ctypes.data), w, h, img.strides[0], fmt)
+    image._buffer = img
+    return image
+
+
+def to_qimage(img):
+    """
+    将OpenCV格式的图像包装为QImage，不复制像素数据
+    行跨度取自img.strides[0]，裁剪得到的视图也可以直接包装，只有像素不连续时才复制
+    QImage只引用img的内存，使用期间需要保留_buffer属性的引用
+    """
+    img = to_uint8(img)
+    if img.ndim == 3 and img.shape[2] == 1:
+        img = img[..., 0]
+    channels = 1 if img.ndim == 2 else img.shape[2]
+    fmt = QIMAGE_FORMATS.get(channels)
+    if fmt is None:
+        # 大端机器上的4通道图像，转换为字节顺序固定的RGBA8888
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA)
+        fmt = QImage.Format_RGBA8888
+    if img.strides[-1] != img.itemsize or img.strides[0] <= 0 or \
+            (img.ndim == 3 and img.strides[1] != channels):
+        img = np.ascontiguousarray(img)
+    return wrap_qimage(img, fmt)
+
+
+def to_display_image(img):
+    """
+    生成像素图用的QImage
+    Qt把BGR888和Grayscale8转换为像素图的原生格式RGB32很慢，改由OpenCV扩展为BGRA(一次复制)，
+    以RGB32包装后QPixmap.fromImage直接共享这块内存，不再转换
+    """
+    img = to_uint8(img)
+    code = DISPLAY_CONVERSIONS.get(1 if img.ndim == 2 else img.shape[2])
+    if code is not None and sys.byteorder == 'little':
+        return wrap_qimage(cv2.cvtColor(img, code), QImage.Format_RGB32)
+    return to_qimage(img)
+
+
+class TiledImageItem(QGraphicsObject):
+    """
+    分块、多级分辨率显示的图像项，代替整图的QGraphicsPixmapItem
+    图像按2倍逐级缩小构成金字塔，绘制时按当前缩放选择级别，只转换与可见区域相交的块，
+    转换好的块按LRU缓存，超大图像也不需要分配整图的像素图
+    金字塔在后台线程中逐级生成，生成前先用已有的最接近的级别绘制
+    """
+    level_ready = pyqtSignal(int, object)  # 图像版本号, 新生成的一级图像
+
+    def __init__(self, tile_size=256, max_bytes=256 * 1024 * 1024, parent=None):
+        super(TiledImageItem, self).__init__(parent)
+        self.tile_size = tile_size  # 块的边长(所在级别的像素)
+        self.max_bytes = max_bytes  # 缓存块像素图的内存上限
+        self._levels = []  # 金字塔，第0级为原图，其余各级由后台线程依次生成
+        self._generation = 0  # 图像的版本号，更换图像后旧图像的金字塔结果作废
+        self._pool = None  # 生成金字塔的线程，第一次需要时创建
+        self._tiles = OrderedDict()  # (级别, 行, 列) -> (像素图, 像素数据)
+        self._bytes = 0
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # 绘制时提供需要重绘的区域
+        self.level_ready.connect(self.add_level)
+
+    @property
+    def image(self):
+        return self._levels[0] if self._levels else None
+
+    def set_image(self, img):
+        """更换显示的图像，清空金字塔和块缓存，在后台生成新的金字塔"""
+        self.prepareGeometryChange()
+        self._generation += 1
+        self._levels = [img]
+        self._tiles.clear()
+        self._bytes = 0
+        if self.top_level() > 0:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(1, thread_name_prefix='pyramid')
+            self._pool.submit(self.build_levels, self._generation, img)
+        self.update()
+
+    def build_levels(self, generation, img):
+        """后台线程：逐级缩小，每生成一级就发回界面线程，图像已更换时停止"""
+        level = img
+        for _ in range(self.top_level()):
+            if generation != self._generation:
+                return
+            h, w = level.shape[:2]
+            level = cv2.resize(level, ((w + 1) // 2, (h + 1) // 2), interpolation=cv2.INTER_AREA)
+            self.level_ready.emit(generation, level)
+
+    def add_level(self, generation, level):
+        """界面线程：新的一级加入金字塔，重绘以换用更合适的级别"""
+        if generation == self._generation:
+            self._levels.append(level)
+            self.update()
+
+    def boundingRect(self):
+        if not self._levels:
+            return QRectF()
+        h, w = self._levels[0].shape[:2]
+        return QRectF(0, 0, w, h)
+
+    def top_level(self):
+        """金字塔的最高级别：缩到一块以内即可"""
+        if not self._levels:
+            return 0
+        h, w = self._levels[0].shape[:2]
+        return max(0, math.ceil(math.log2(max(h, w) / self.tile_size)))
+
+    def choose_level(self, lod):
+        """
+        一个原图像素对应lod个屏幕像素时使用的级别：
+        该级的一个像素不大于一个屏幕像素(不损失清晰度)的最高级别，尚未生成时用已有的最高级别
+        """
+        if lod <= 0 or lod >= 1:
+            return 0
+        k = min(int(math.floor(math.log2(1 / lod))), self.top_level())
+        return min(k, len(self._levels) - 1)
+
+    def tile(self, k, row, col):
+        """第k级第row行col列块的像素图"""
+        key = (k, row, col)
+        entry = self._tiles.get(key)
+        if entry is not None:
+            self._tiles.move_to_end(key)
+            return entry[0]
+        t = self.tile_size
+        image = to_display_image(self._levels[k][row * t:(row + 1) * t, col * t:(col + 1) * t])
+        # 像素图可能直接引用QImage的内存，缓存期间一起保留
+        pixmap = QPixmap.fromImage(image)
+        self._tiles[key] = (pixmap, image._buffer)
+        self._bytes += image._buffer.nbytes
+        while self._bytes > self.max_bytes and len(self._tiles) > 1:
+            _, (_, buffer) = self._tiles.popitem(last=False)
+            self._bytes -= buffer.nbytes
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        if not self._levels:
+            return
+        lod = option.levelOfDetailFromTransform(painter.worldTransform()) * painter.device().devicePixelRatioF()
+        k = self.choose_level(lod)
+        img = self._levels[0]
+        level = self._levels[k]
+        h, w = img.shape[:2]
+        lh, lw = level.shape[:2]
+        sx, sy = w / lw, h / lh  # 第k级像素在原图中的大小
+        t = self.tile_size
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        col0, col1 = int(exposed.left() / sx) // t, int(math.ceil(exposed.right() / sx) - 1) // t
+        row0, row1 = int(exposed.top() / sy) // t, int(math.ceil(exposed.bottom() / sy) - 1) // t
+        for row in range(max(0, row0), min(row1, (lh - 1) // t) + 1):
+            for col in range(max(0, col0), min(col1, (lw - 1) // t) + 1):
+                pixmap = self.tile(k, row, col)
+                target = QRectF(col * t * sx, row * t * sy, pixmap.width() * sx, pixmap.height() * sy)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
 
 
 class GraphicsView(QGraphicsView):
     """图像显示视图类，用于展示和交互处理后的图像"""
+    zoomed = pyqtSignal()  # 滚轮缩放后发出
+    roi_changed = pyqtSignal(object)  # 选区改变: 原图像素的范围(y0, y1, x0, x1)，取消选区时为None
     
-    def __init__(self, parent=None):
-        """初始化图像显示视图，设置基本属性和场景"""
+    def __init__(self, parent=None, tile_size=256, tile_cache_bytes=256 * 1024 * 1024):
+        """
+        初始化图像显示视图，设置基本属性和场景
+        :param tile_size: 分块显示时块的边长
+        :param tile_cache_bytes: 缓存块像素图的内存上限
+        """
         super(GraphicsView, self).__init__(parent=parent)
         self._zoom = 0  # 缩放级别
         self._empty = True  # 标记是否有图像
-        self._photo = QGraphicsPixmapItem()  # 图像显示项
+        self._photo = TiledImageItem(tile_size, tile_cache_bytes)  # 图像显示项
         self._scene = QGraphicsScene(self)  # 图形场景
         self._scene.addItem(self._photo)  # 将图像项添加到场景
+        # 只处理选区时，选区的结果作为图像项的子项叠加在未处理的图像上
+        self._region = TiledImageItem(tile_size, tile_cache_bytes // 4, self._photo)
+        self._region.hide()
+        self._roi_mode = False  # 为True时鼠标拖动框选选区，否则拖动平移图像
+        self._roi_origin = None  # 正在框选时的起点(场景坐标)
+        self.roi = None  # 当前选区(y0, y1, x0, x1)
+        self._roi_item = QGraphicsRectItem()  # 选区边框
+        pen = QPen(Qt.yellow, 1, Qt.DashLine)
+        pen.setCosmetic(True)  # 线宽不随缩放变化
+        self._roi_item.setPen(pen)
+        self._roi_item.setZValue(1)
+        self._roi_item.hide()
+        self._scene.addItem(self._roi_item)
         self.setScene(self._scene)  # 设置场景
         self.setAlignment(Qt.AlignCenter)  # 图像居中显示
         self.setDragMode(QGraphicsView.ScrollHandDrag)  # 设置拖动模式为手型滚动
@@ -31,50 +238,125 @@ class GraphicsView(QGraphicsView):
         save_action = QAction('另存为', self)  # 创建保存动作
         save_action.triggered.connect(self.save_current)  # 连接保存事件
         menu.addAction(save_action)  # 添加动作到菜单
+        if self.roi is not None:
+            clear_action = QAction('取消选区', self)
+            clear_action.triggered.connect(lambda: self.clear_roi(notify=True))
+            menu.addAction(clear_action)
         menu.exec(QCursor.pos())  # 在鼠标位置显示菜单
     
     def save_current(self):
-        """保存当前显示的图像到文件"""
+        """保存原始分辨率的处理结果，按格式选择编码参数，编码在后台线程中进行"""
         # 打开文件保存对话框，获取文件名
-        file_name = QFileDialog.getSaveFileName(self, '另存为', './', 'Image files(*.jpg *.gif *.png)')[0]
-        print(file_name)
-        if file_name:
-            # 保存图像到指定文件
-            self._photo.pixmap().save(file_name)
+        file_name = QFileDialog.getSaveFileName(self, '另存为', './',
+                                                'Image files(*.jpg *.png *.webp *.bmp *.tif *.gif)')[0]
+        if not file_name:
+            return
+        params = []
+        option = ENCODE_OPTIONS.get(os.path.splitext(file_name)[1].lower())
+        if option is not None:
+            label, _, minimum, maximum, default = option
+            value, ok = QInputDialog.getInt(self, '另存为', label, default, minimum, maximum)
+            if not ok:
+                return
+            params = encode_params(file_name, value)
+        self.parent().export_image(file_name, params)
     
     def get_image(self):
         """获取当前显示的图像"""
         if self.has_photo():
-            # 将QGraphicsPixmapItem转换为QImage返回
-            return self._photo.pixmap().toImage()
+            # 复制一份，不再引用显示图像的内存
+            return to_qimage(self._photo.image).copy()
     
     def has_photo(self):
         """检查是否有图像显示"""
         return not self._empty
     
-    def change_image(self, img):
+    def change_image(self, img, scale=1.0):
         """更新显示图像并适应视图"""
-        self.update_image(img)  # 更新图像显示
+        self.update_image(img, scale)  # 更新图像显示
         self.fitInView()  # 适应视图大小
     
-    def img_to_pixmap(self, img):
-        """将OpenCV格式的图像转换为QPixmap"""
-        # BGR转RGB色彩空间
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, c = img.shape  # 获取图像高度、宽度和通道数
-        # 创建QImage对象，注意行字节数为3*w（RGB三通道）
-        image = QImage(img, w, h, 3 * w, QImage.Format_RGB888)
-        return QPixmap.fromImage(image)  # 转换为QPixmap返回
-    
-    def update_image(self, img):
-        """更新图像显示内容"""
+    def update_image(self, img, scale=1.0):
+        """
+        更新图像显示内容
+        :param scale: 图像的缩放比例，预览图按1/scale放大显示，使场景坐标始终对应原图像素
+        """
         self._empty = False  # 标记为有图像
-        # 设置图像项的像素图
-        self._photo.setPixmap(self.img_to_pixmap(img))
+        self._photo.set_image(img)  # 只保存图像，绘制时再转换可见的块
+        self._photo.setScale(1 / scale)
+    
+    def show_region(self, img, rect):
+        """
+        在未处理的图像上叠加显示选区的处理结果
+        :param rect: 选区在当前显示图像中的范围(y0, y1, x0, x1)
+        """
+        self._region.set_image(img)
+        self._region.setPos(rect[2], rect[0])
+        self._region.show()
+    
+    def hide_region(self):
+        self._region.hide()
+    
+    def set_roi_mode(self, enabled):
+        """切换框选模式，退出时取消选区"""
+        self._roi_mode = enabled
+        self.setDragMode(QGraphicsView.NoDrag if enabled else QGraphicsView.ScrollHandDrag)
+        if not enabled:
+            self.clear_roi(notify=True)
+    
+    def clear_roi(self, notify=False):
+        """取消选区，notify为True时发出roi_changed(None)"""
+        had_roi, self.roi = self.roi is not None, None
+        self._roi_item.hide()
+        self._region.hide()
+        if notify and had_roi:
+            self.roi_changed.emit(None)
+    
+    def mousePressEvent(self, event):
+        """框选模式下按下左键开始框选"""
+        if self._roi_mode and event.button() == Qt.LeftButton and self.has_photo():
+            self._roi_origin = self.mapToScene(event.pos())
+            self._roi_item.setRect(QRectF(self._roi_origin, self._roi_origin))
+            self._roi_item.show()
+            return
+        super(GraphicsView, self).mousePressEvent(event)
+    
+    def mouseMoveEvent(self, event):
+        if self._roi_origin is not None:
+            rect = QRectF(self._roi_origin, self.mapToScene(event.pos())).normalized()
+            self._roi_item.setRect(rect.intersected(self._photo.sceneBoundingRect()))
+            return
+        super(GraphicsView, self).mouseMoveEvent(event)
+    
+    def mouseReleaseEvent(self, event):
+        """框选结束，选区按原图像素取整后发出"""
+        if self._roi_origin is not None and event.button() == Qt.LeftButton:
+            self._roi_origin = None
+            rect = self._roi_item.rect()
+            x0, y0 = math.floor(rect.left()), math.floor(rect.top())
+            x1, y1 = math.ceil(rect.right()), math.ceil(rect.bottom())
+            if x1 - x0 < 2 or y1 - y0 < 2:
+                self.clear_roi(notify=True)  # 单击取消选区
+                return
+            self._roi_item.setRect(QRectF(x0, y0, x1 - x0, y1 - y0))
+            self.roi = (y0, y1, x0, x1)
+            self.roi_changed.emit(self.roi)
+            return
+        super(GraphicsView, self).mouseReleaseEvent(event)
+    
+    def view_scale(self):
+        """当前视图中一个原图像素对应的屏幕像素数"""
+        unity = self.transform().mapRect(QRectF(0, 0, 1, 1))
+        return max(unity.width(), unity.height()) * self.devicePixelRatioF()
+    
+    def fit_scale(self, width, height):
+        """图像适应视图时一个原图像素对应的屏幕像素数，与旋转方向无关"""
+        viewrect = self.viewport().rect()
+        return max(viewrect.width(), viewrect.height()) / max(width, height) * self.devicePixelRatioF()
     
     def fitInView(self, scale=True):
         """使图像适应视图大小"""
-        rect = QRectF(self._photo.pixmap().rect())  # 获取图像矩形
+        rect = self._photo.sceneBoundingRect()  # 获取图像在场景中的矩形
         if not rect.isNull():
             self.setSceneRect(rect)  # 设置场景矩形
             if self.has_photo():
@@ -108,3 +390,4 @@ class GraphicsView(QGraphicsView):
                 self.fitInView()  # 适应视图
             else:
                 self._zoom = 0  # 防止缩放级别为负
+            self.zoomed.emit()
@@ -0,0 +1,44 @@
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from core.histogram import histogram
+
+# 各通道曲线的颜色，按OpenCV的通道顺序
+CHANNEL_COLORS = {
+    1: (QColor(187, 187, 187),),
+    3: (QColor(66, 133, 244), QColor(52, 168, 83), QColor(234, 67, 53)),
+    4: (QColor(66, 133, 244), QColor(52, 168, 83), QColor(234, 67, 53), QColor(187, 187, 187, 128)),
+}
+
+
+class HistogramWidget(QWidget):
+    """直方图面板，每次处理完成后更新，直接用QPainter绘制各通道的曲线"""
+
+    def __init__(self, max_samples=None, parent=None):
+        """:param max_samples: 像素数超过该值时按跨步采样统计"""
+        super(HistogramWidget, self).__init__(parent=parent)
+        self.max_samples = max_samples
+        self._hist = None  # (通道数, 256)的计数
+        self.setMinimumSize(256, 150)
+
+    def set_image(self, img):
+        """统计图像的直方图并重绘，img为None时清空"""
+        self._hist = None if img is None else histogram(img, self.max_samples)
+        self.update()
+
+    def paintEvent(self, event):
+        if self._hist is None:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = QRectF(self.rect()).adjusted(4, 4, -4, -4)
+        peak = max(int(self._hist.max()), 1)
+        colors = CHANNEL_COLORS.get(len(self._hist), CHANNEL_COLORS[1] * len(self._hist))
+        for counts, color in zip(self._hist, colors):
+            path = QPainterPath(QPointF(rect.left(), rect.bottom()))
+            for value, count in enumerate(counts):
+                path.lineTo(rect.left() + rect.width() * value / 255, rect.bottom() - rect.height() * count / peak)
+            painter.setPen(QPen(color, 1))
+            painter.drawPath(path)
+        painter.end()
@@ -39,22 +39,47 @@ class UsedListWidget(MyListWidget):
 
     def delete_item(self, item):
         # 删除操作
-        self.takeItem(self.row(item))
+        self.mainwindow.stackedWidget.flush()
+        row = self.row(item)
+        self.takeItem(row)
+        self.mainwindow.stage_cache.invalidate(row)  # 只有其后的中间结果失效
         self.mainwindow.update_image()  # 更新frame
         self.mainwindow.dock_attr.close()
 
     def dropEvent(self, event):
+        old_row = self.currentRow()
         super().dropEvent(event)
+        new_row = self.currentRow()
+        # 拖动排序只影响两个位置中靠前者及其后的结果
+        if old_row >= 0 and new_row >= 0:
+            self.mainwindow.stage_cache.invalidate(min(old_row, new_row))
+        self.mainwindow.update_image()
+
+    def set_stages(self, stages, invalidate=True):
+        """
+        用操作链(core.operations)替换已选操作，用于打开保存的处理流程和撤销/重做
+        :param invalidate: 是否丢弃原操作链的中间结果
+        """
+        item_types = {item.operation.__name__: item for item in items}
+        self.clear()
+        for stage in stages:
+            item = item_types[type(stage).__name__]()
+            item.update_params(stage.get_params())
+            self.addItem(item)
+        if invalidate:
+            self.mainwindow.stage_cache.invalidate(0)
+        self.mainwindow.dock_attr.close()
         self.mainwindow.update_image()
 
     def show_attr(self):
         item = self.itemAt(self.mapFromGlobal(QCursor.pos()))
         if not item: return
+        self.mainwindow.stackedWidget.flush()  # 先提交上一项未提交的修改
         param = item.get_params()  # 获取当前item的属性
         if type(item) in items:
             index = items.index(type(item))  # 获取item对应的table索引
-            self.mainwindow.stackedWidget.setCurrentIndex(index)
-            self.mainwindow.stackedWidget.currentWidget().update_params(param)  # 更新对应的table
+            table = self.mainwindow.stackedWidget.show_table(index)  # 首次显示时创建
+            table.update_params(param)  # 更新对应的table
             self.mainwindow.dock_attr.show()
 
 
@@ -0,0 +1,85 @@
+import threading
+import traceback
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from core.pipeline import result_key
+from core.profiling import RunProfile
+from core.tiling import composite
+
+
+class PipelineWorker(QThread):
+    """
+    后台图像处理线程
+    界面线程只提交请求，线程总是处理最新的请求：
+    尚未开始的旧请求直接被覆盖，正在处理的旧请求在两级操作之间取消
+    """
+    # 请求序号, 处理结果(整幅图像), 是否适应视图, 图像缩放比例, 性能记录, 结果的缓存键, 选区(只处理了选区时)
+    result_ready = pyqtSignal(int, object, bool, float, object, object, object)
+    failed = pyqtSignal(int, str)  # 请求序号, 错误信息
+
+    def __init__(self, cache, parent=None):
+        super(PipelineWorker, self).__init__(parent)
+        self.cache = cache  # 逐级结果缓存，与界面线程共享
+        self._cond = threading.Condition()
+        self._pending = None  # 等待处理的最新请求
+        self._seq = 0  # 最新请求的序号
+        self._fit = False  # 被合并的请求中是否有需要适应视图的
+        self._running = True
+
+    def submit(self, src, source_key, stages, fit=False, scale=1.0, profile=False, path=None, roi=None):
+        """
+        提交处理请求，覆盖尚未开始的旧请求
+        :param stages: 操作项的快照，处理期间界面对操作项的修改不会影响它们
+        :param scale: src相对原图的缩放比例，随结果一起返回
+        :param profile: 是否记录各级的耗时(core.profiling.RunProfile)，随结果一起返回
+        :param path: src是该文件完整解码的结果时给出，用于读取磁盘结果缓存
+        :param roi: 只处理src中的选区(y0, y1, x0, x1)，处理结果贴回未处理的src，仍返回整幅图像
+        :return: 请求序号
+        """
+        with self._cond:
+            self._seq += 1
+            self._fit = self._fit or fit
+            self._pending = (self._seq, src, source_key, stages, scale, profile, path, roi)
+            self._cond.notify()
+            return self._seq
+
+    def stop(self):
+        """结束线程，等待当前操作完成"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+
+    def is_superseded(self, seq):
+        """请求是否已被更新的请求取代"""
+        return seq != self._seq or not self._running
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                seq, src, source_key, stages, scale, profile, path, roi = self._pending
+                self._pending = None
+            profile = RunProfile(scale) if profile else None
+            try:
+                cancelled = lambda: self.is_superseded(seq)
+                if roi is not None:
+                    img, roi = self.cache.run_region(src, source_key, stages, roi, cancelled, profile)
+                    if img is not None and roi is not None:
+                        img = composite(src, img, roi)
+                else:
+                    img = self.cache.run(src, source_key, stages, cancelled, profile, source_path=path)
+            except Exception as e:
+                traceback.print_exc()
+                self.failed.emit(seq, str(e))
+                continue
+            with self._cond:
+                if img is None or self.is_superseded(seq):
+                    continue
+                fit, self._fit = self._fit, False
+            key = result_key(source_key if roi is None else (source_key, roi), stages)
+            self.result_ready.emit(seq, img, fit, scale, profile, key, roi)
@@ -3,8 +3,33 @@ from config import tables
 
 
 class StackedWidget(QStackedWidget):
+    """
+    参数设置堆栈窗口
+    各操作的参数表格在第一次显示时才创建，启动时不构建用不到的表格
+    """
+
     def __init__(self, parent):
         super().__init__(parent=parent)
-        for table in tables:
-            self.addWidget(table(parent=parent))
+        self.mainwindow = parent
+        self._tables = {}  # 已创建的表格: tables中的索引 -> 表格
         self.setMinimumWidth(200)
+
+    def table(self, index):
+        """tables中第index种表格，首次访问时创建"""
+        table = self._tables.get(index)
+        if table is None:
+            table = self._tables[index] = tables[index](parent=self.mainwindow)
+            self.addWidget(table)
+        return table
+
+    def show_table(self, index):
+        """切换到第index种表格并返回它"""
+        table = self.table(index)
+        self.setCurrentWidget(table)
+        return table
+
+    def flush(self):
+        """提交当前表格中尚未提交的参数变化"""
+        table = self.currentWidget()
+        if table is not None:
+            table.flush()
@@ -5,6 +5,8 @@ from PyQt5.QtCore import *
 class TableWidget(QTableWidget):
     """表格部件基类，定义图像处理参数表格的通用功能"""
     
+    debounce_ms = 80  # 参数变化的合并窗口(毫秒)，窗口内的连续变化只触发一次处理
+    
     def __init__(self, parent=None):
         """初始化表格部件，设置基本外观和行为"""
         super(TableWidget, self).__init__(parent=parent)
@@ -18,36 +20,65 @@ class TableWidget(QTableWidget):
         self.verticalHeader().sectionResizeMode(QHeaderView.Stretch)  # 垂直方向拉伸填充
         self.horizontalHeader().setStretchLastSection(True)  # 最后一列拉伸填充
         self.setFocusPolicy(Qt.NoFocus)  # 表格不获取焦点
+        
+        self._target = None  # 本轮参数变化对应的列表项
+        self._commit_timer = QTimer(self)  # 合并连续变化的定时器
+        self._commit_timer.setSingleShot(True)
+        self._commit_timer.setInterval(self.debounce_ms)
+        self._commit_timer.timeout.connect(self.update_item)
     
     def signal_connect(self):
-        """连接所有控件的信号到更新处理函数"""
+        """连接所有控件的信号到参数变化处理函数"""
         for spinbox in self.findChildren(QSpinBox):
-            spinbox.valueChanged.connect(self.update_item)  # 整数输入框值变化信号
+            spinbox.valueChanged.connect(self.schedule_update)  # 整数输入框值变化信号
         for doublespinbox in self.findChildren(QDoubleSpinBox):
-            doublespinbox.valueChanged.connect(self.update_item)  # 浮点数输入框值变化信号
+            doublespinbox.valueChanged.connect(self.schedule_update)  # 浮点数输入框值变化信号
         for combox in self.findChildren(QComboBox):
-            combox.currentIndexChanged.connect(self.update_item)  # 下拉框选择变化信号
+            combox.currentIndexChanged.connect(self.schedule_update)  # 下拉框选择变化信号
         for checkbox in self.findChildren(QCheckBox):
-            checkbox.stateChanged.connect(self.update_item)  # 复选框状态变化信号
+            checkbox.stateChanged.connect(self.schedule_update)  # 复选框状态变化信号
+    
+    def schedule_update(self):
+        """记录参数变化，合并窗口结束后再统一提交"""
+        if self._target is None:
+            self._target = self.mainwindow.useListWidget.currentItem()
+        self._commit_timer.start()  # 窗口内的每次变化都重新计时
+    
+    def flush(self):
+        """立即提交尚未提交的参数变化(切换列表项前调用)"""
+        if self._commit_timer.isActive():
+            self._commit_timer.stop()
+            self.update_item()
     
     def update_item(self):
-        """更新表格项数据，并通知主窗口更新图像"""
-        param = self.get_params()  # 获取当前参数
-        self.mainwindow.useListWidget.currentItem().update_params(param)  # 更新当前列表项参数
+        """只把实际变化的参数写入列表项，有变化时通知主窗口更新图像"""
+        item, self._target = self._target, None
+        if item is None or item.listWidget() is None:
+            return  # 列表项已被删除
+        old = item.get_params()
+        changed = {k: v for k, v in self.get_params().items() if k in old and old[k] != v}
+        if not changed:
+            return
+        item.update_params(changed)  # 更新当前列表项参数
+        # 逐级缓存以参数指纹为键，只有该操作及其后的结果需要重新计算
         self.mainwindow.update_image()  # 通知主窗口更新图像显示
     
     def update_params(self, param=None):
-        """根据参数更新表格控件的值"""
+        """根据参数更新表格控件的值，填充期间不触发参数变化"""
         if param is None:
             param = {}
         for key in param.keys():
             box = self.findChild(QWidget, name=key)  # 根据对象名查找控件
+            if box is None:
+                continue
+            box.blockSignals(True)
             if isinstance(box, QSpinBox) or isinstance(box, QDoubleSpinBox):
                 box.setValue(param[key])  # 设置数值控件值
             elif isinstance(box, QComboBox):
                 box.setCurrentIndex(param[key])  # 设置下拉框选中索引
             elif isinstance(box, QCheckBox):
                 box.setChecked(param[key])  # 设置复选框状态
+            box.blockSignals(False)
     
     def get_params(self):
         """获取当前表格中所有控件的参数值"""
@@ -393,13 +424,20 @@ class SaltAndPepperTableWidget(TableWidget):
         self.noise_ratio_spin.setSingleStep(0.01)  # 步长0.01
         self.noise_ratio_spin.setSuffix(' (噪声比例)')
         
+        # 随机种子输入框，种子相同时噪声相同
+        self.seed_spin = QSpinBox()
+        self.seed_spin.setObjectName('seed')
+        self.seed_spin.setRange(0, 2 ** 31 - 1)
+        
         # 设置表格结构
         self.setColumnCount(2)
-        self.setRowCount(3)
+        self.setRowCount(4)
         self.setItem(0, 0, QTableWidgetItem('食盐噪声阈值'))
         self.setCellWidget(0, 1, self.salt_threshold_spin)
         self.setItem(1, 0, QTableWidgetItem('胡椒噪声阈值'))
         self.setCellWidget(1, 1, self.pepper_threshold_spin)
         self.setItem(2, 0, QTableWidgetItem('噪声比例'))
         self.setCellWidget(2, 1, self.noise_ratio_spin)
+        self.setItem(3, 0, QTableWidgetItem('随机种子'))
+        self.setCellWidget(3, 1, self.seed_spin)
         self.signal_connect()
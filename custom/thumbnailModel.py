@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from core.imageio import is_image_file
+from core.thumbnails import ThumbnailCache
+from custom.graphicsView import to_display_image
+
+
+class ThumbnailFileSystemModel(QFileSystemModel):
+    """
+    带缩略图的文件系统模型
+    视图只为可见的行请求图标，因此缩略图随滚动按需生成：
+    请求放入栈中由线程池在后台解码或读取磁盘缓存，最近请求的(当前可见的)行优先处理，
+    完成后通过信号回到界面线程转换为图标并刷新对应的行
+    """
+    thumbnail_ready = pyqtSignal(str, object)  # 文件路径, 缩略图(None表示无法解码)
+
+    max_pending = 512  # 等待生成的请求数上限，快速滚动时丢弃最早的(已滚出视图的)请求
+
+    def __init__(self, cache_dir, size=96, max_bytes=256 * 1024 * 1024, workers=4, max_icons=2000, parent=None):
+        """
+        :param cache_dir: 磁盘缓存目录
+        :param size: 缩略图长边的像素数
+        :param max_bytes: 磁盘缓存的大小上限
+        :param workers: 生成缩略图的线程数
+        :param max_icons: 内存中保留的图标数
+        """
+        super(ThumbnailFileSystemModel, self).__init__(parent)
+        self.cache = ThumbnailCache(cache_dir, size, max_bytes)
+        self.max_icons = max_icons
+        self.thumbnails = False  # 是否显示缩略图
+        self._icons = OrderedDict()  # 文件路径 -> 图标(None表示无法解码)，按LRU淘汰
+        self._lock = threading.Lock()
+        self._stack = []  # 等待生成的文件路径，后请求的先处理
+        self._requested = set()  # 已请求尚未完成的文件路径
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='thumbnail')
+        self._closed = False
+        self.thumbnail_ready.connect(self.on_thumbnail_ready)
+
+    def set_thumbnails(self, enabled):
+        """打开或关闭缩略图显示，视图需要随后重绘"""
+        self.thumbnails = enabled
+
+    def data(self, index, role=Qt.DisplayRole):
+        if self.thumbnails and role == Qt.DecorationRole and index.column() == 0:
+            path = self.filePath(index)
+            if is_image_file(path):
+                icon = self.thumbnail(path)
+                if icon is not None:
+                    return icon
+        return super(ThumbnailFileSystemModel, self).data(index, role)
+
+    def thumbnail(self, path):
+        """内存中已有的缩略图图标，没有时提交后台生成并返回None"""
+        if path in self._icons:
+            self._icons.move_to_end(path)
+            return self._icons[path]
+        with self._lock:
+            if path in self._requested:
+                if path not in self._stack:
+                    return None  # 正在生成
+                self._stack.remove(path)  # 再次请求的移到栈顶，优先处理
+            else:
+                self._requested.add(path)
+                self._pool.submit(self._work)
+            self._stack.append(path)
+            if len(self._stack) > self.max_pending:
+                self._requested.discard(self._stack.pop(0))
+        return None
+
+    def _work(self):
+        """线程池任务：处理栈顶的请求"""
+        with self._lock:
+            if self._closed or not self._stack:
+                return
+            path = self._stack.pop()
+        try:
+            img = self.cache.get(path)
+        except Exception:
+            img = None
+        if not self._closed:
+            self.thumbnail_ready.emit(path, img)
+
+    def on_thumbnail_ready(self, path, img):
+        """界面线程中把缩略图转换为图标并刷新对应的行"""
+        with self._lock:
+            self._requested.discard(path)
+        self._icons[path] = None if img is None else QIcon(QPixmap.fromImage(to_display_image(img)))
+        while len(self._icons) > self.max_icons:
+            self._icons.popitem(last=False)
+        index = self.index(path)
+        if index.isValid():
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def shutdown(self):
+        """放弃尚未开始的请求，不等待正在生成的缩略图"""
+        with self._lock:
+            self._closed = True
+            self._stack.clear()
+        self._pool.shutdown(wait=False)
@@ -1,9 +1,15 @@
-import cv2
-import numpy as np
-
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 
+import os
+
+from core.imageio import is_image_file, image_size, read_reduced
+from core.loader import ImageLoader
+from core.video import is_video_file
+from custom.thumbnailModel import ThumbnailFileSystemModel
+from config import THUMBNAIL_SIZE, THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_BYTES, THUMBNAIL_WORKERS
+from config import IMAGE_CACHE_BYTES, PREFETCH_WORKERS, LARGE_IMAGE_PIXELS, FIRST_DISPLAY_SIDE
+
 
 class FileSystemTreeView(QTreeView):
     """
@@ -16,8 +22,9 @@ class FileSystemTreeView(QTreeView):
         super().__init__(parent=parent)
         self.mainwindow = parent  # 引用主窗口
         
-        # 创建文件系统模型并设置根路径为当前目录
-        self.fileSystemModel = QFileSystemModel()
+        # 创建文件系统模型并设置根路径为当前目录，缩略图模式下在后台生成图像文件的缩略图
+        self.fileSystemModel = ThumbnailFileSystemModel(THUMBNAIL_CACHE_DIR, THUMBNAIL_SIZE, THUMBNAIL_CACHE_BYTES,
+                                                        THUMBNAIL_WORKERS, parent=self)
         self.fileSystemModel.setRootPath('.')
         self.setModel(self.fileSystemModel)
         
@@ -35,6 +42,15 @@ class FileSystemTreeView(QTreeView):
         # 连接双击事件到图像选择处理函数
         self.doubleClicked.connect(self.select_image)
         self.setMinimumWidth(200)  # 设置最小宽度
+        self._icon_size = self.iconSize()  # 文件名模式下的图标尺寸
+        self.loader = ImageLoader(IMAGE_CACHE_BYTES, PREFETCH_WORKERS)  # 解码后原图的缓存，预取相邻图像
+        self._current = QPersistentModelIndex()  # 当前显示的图像文件
+    
+    def set_thumbnails(self, enabled):
+        """切换缩略图模式，图标放大为缩略图尺寸"""
+        self.fileSystemModel.set_thumbnails(enabled)
+        self.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE) if enabled else self._icon_size)
+        self.viewport().update()
     
     def select_image(self, file_index):
         """
@@ -44,10 +60,62 @@ class FileSystemTreeView(QTreeView):
         # 获取文件完整路径
         file_name = self.fileSystemModel.filePath(file_index)
         
+        # 视频文件逐帧处理并播放
+        if is_video_file(file_name):
+            self.mainwindow.open_video(file_name)
+            return
+        
         # 检查是否为图像文件
-        if file_name.endswith(('.jpg', '.png', '.bmp')):
-            # 使用OpenCV读取图像，支持中文路径
-            src_img = cv2.imdecode(np.fromfile(file_name, dtype=np.uint8), -1)
+        if is_image_file(file_name):
+            # 最近看过或已预取的图像直接取自缓存；超大图像先按缩小倍数解码用于显示，
+            # 需要更高分辨率时主窗口再在后台加载原图；其它图像读取并解码
+            src_img, scale = self.loader.cached(file_name), 1.0
+            if src_img is None and self.is_large(file_name):
+                src_img, factor = read_reduced(file_name, FIRST_DISPLAY_SIDE)
+                scale = 1.0 / factor
+            if src_img is None:
+                src_img = self.loader.get(file_name)
+            if src_img is None:
+                return
+            self._current = QPersistentModelIndex(file_index)
             
             # 通知主窗口更新图像
-            self.mainwindow.change_image(src_img)
+            self.mainwindow.change_image(src_img, scale, file_name)
+            
+            # 在后台预先解码同一目录中的前后两张图像，超大图像不预取
+            neighbors = (self.fileSystemModel.filePath(index)
+                         for index in (self.neighbor(file_index, 1), self.neighbor(file_index, -1))
+                         if index.isValid())
+            self.loader.prefetch(path for path in neighbors if not self.is_large(path))
+    
+    @staticmethod
+    def is_large(path):
+        """
+        是否为超大图像：像素数超过LARGE_IMAGE_PIXELS
+        文件头中没有尺寸的格式(如TIFF)按文件字节数估计
+        """
+        size = image_size(path)
+        if size is not None:
+            return size[0] * size[1] > LARGE_IMAGE_PIXELS
+        return os.path.getsize(path) > LARGE_IMAGE_PIXELS
+    
+    def neighbor(self, file_index, step):
+        """同一目录中按显示顺序的下一张(step=1)或上一张(step=-1)图像，没有时返回无效索引"""
+        parent = file_index.parent()
+        row = file_index.row() + step
+        while 0 <= row < self.fileSystemModel.rowCount(parent):
+            index = self.fileSystemModel.index(row, 0, parent)
+            if is_image_file(self.fileSystemModel.fileName(index)):
+                return index
+            row += step
+        return QModelIndex()
+    
+    def step_image(self, step):
+        """切换到当前目录中的下一张或上一张图像(键盘翻页)"""
+        if not self._current.isValid():
+            return
+        index = self.neighbor(QModelIndex(self._current), step)
+        if index.isValid():
+            self.setCurrentIndex(index)
+            self.scrollTo(index)
+            self.select_image(index)
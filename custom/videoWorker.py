@@ -0,0 +1,76 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from core.video import VideoStream, export_video
+from custom.graphicsView import to_uint8
+
+
+class VideoPlayer(QObject):
+    """
+    实时播放视频：解码和处理在core.video.VideoStream的线程中进行，处理结果通过信号回到界面线程
+    界面还没有显示上一帧时丢弃新的帧，显示跟不上也不会积压
+    """
+    frame_ready = pyqtSignal(int, object)  # 帧序号, 处理后的图像
+    failed = pyqtSignal(str)  # 处理出错、播放已停止时的错误信息
+
+    def __init__(self, path, stages, executor=None, queue_size=2, parent=None):
+        super(VideoPlayer, self).__init__(parent)
+        self._pending = False  # 已发出但界面还没有显示的帧
+        self.stream = VideoStream(path, stages, self._deliver, executor, queue_size, loop=True,
+                                  on_error=self._fail)
+        self.path = path
+
+    @property
+    def meters(self):
+        return self.stream.meters
+
+    def _deliver(self, index, img):
+        """在输出线程中转换为显示用的8位图像，交给界面线程"""
+        if self._pending:
+            self.meters['display'].dropped += 1
+            return
+        self._pending = True
+        self.frame_ready.emit(index, to_uint8(img))
+
+    def _fail(self, e):
+        """在处理线程中把异常转换为错误信息，交给界面线程"""
+        self.failed.emit('%s: %s' % (type(e).__name__, e))
+
+    def frame_shown(self):
+        """界面线程显示完一帧后调用，允许发出下一帧"""
+        self._pending = False
+
+    def set_stages(self, stages):
+        self.stream.set_stages(stages)
+
+    def start(self):
+        self.stream.start()
+
+    def stop(self):
+        self.stream.stop()
+
+
+class VideoExportWorker(QThread):
+    """在后台线程中处理视频的每一帧并写入文件，进度通过信号回到界面线程"""
+    progress = pyqtSignal(int, int)  # 已写入帧数, 总帧数
+    finished_export = pyqtSignal(object, str)  # 各环节统计(出错时为None), 错误信息
+
+    def __init__(self, src, dst, stages, workers=None, parent=None):
+        super(VideoExportWorker, self).__init__(parent)
+        self.src = src
+        self.dst = dst
+        self.stages = stages
+        self.workers = workers
+        self._cancelled = False
+
+    def cancel(self):
+        """停止导出，已写入的帧保留在文件中"""
+        self._cancelled = True
+
+    def run(self):
+        try:
+            meters = export_video(self.src, self.dst, self.stages, workers=self.workers,
+                                  progress=self.progress.emit, cancelled=lambda: self._cancelled)
+        except Exception as e:
+            self.finished_export.emit(None, '%s: %s' % (type(e).__name__, e))
+            return
+        self.finished_export.emit(meters, '')
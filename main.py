@@ -1,20 +1,40 @@
+import time
+START_TIME = time.perf_counter()  # 进程开始导入模块的时间，用于启动耗时测量
+
+import os
 import sys
+import math
+from collections import deque
+
 import cv2
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
-import matplotlib.pyplot as plt
 
 from custom.stackedWidget import StackedWidget
 from custom.treeView import FileSystemTreeView
 from custom.listWidgets import FuncListWidget, UsedListWidget
 from custom.graphicsView import GraphicsView
+from custom.histogramWidget import HistogramWidget
+from custom.pipelineWorker import PipelineWorker
+from custom.exportWorker import ExportWorker, ExportJob
+from core.pipeline import StageCache, save_pipeline, load_pipeline, dump_pipeline, build_pipeline, result_key
+from core.history import EditHistory
+from core.resultcache import ResultCache
+from core.imageio import is_image_file
+from core.tiling import TileExecutor
+from core.profiling import save_chrome_trace
+from config import STAGE_CACHE_BYTES, PREVIEW_MAX_SCALE, PREVIEW_IDLE_MS, TILE_SIZE, TILE_MIN_PIXELS, TILE_WORKERS
+from config import DISPLAY_TILE_SIZE, DISPLAY_CACHE_BYTES, HISTOGRAM_MAX_SAMPLES, PROFILE_HISTORY
+from config import VIDEO_QUEUE_SIZE, VIDEO_EXPORT_WORKERS, HISTORY_BYTES, HISTORY_LENGTH
+from config import RESULT_CACHE_DIR, RESULT_CACHE_BYTES
 
 
 class MyApp(QMainWindow):
     """
     主应用窗口类，集成了图像处理的主要功能
     """
+    full_image_loaded = pyqtSignal(str, object)  # 后台加载原图完成: 文件路径, 图像(None表示失败)
     
     def __init__(self):
         """初始化主窗口，设置UI组件和信号连接"""
@@ -25,17 +45,57 @@ class MyApp(QMainWindow):
         self.action_right_rotate = QAction(QIcon("icons/右旋转.png"), "向右旋转90", self)
         self.action_left_rotate = QAction(QIcon("icons/左旋转.png"), "向左旋转90°", self)
         self.action_histogram = QAction(QIcon("icons/直方图.png"), "直方图", self)
+        self.action_histogram.setCheckable(True)
+        self.action_undo = QAction("撤销", self)
+        self.action_undo.setShortcut(QKeySequence.Undo)
+        self.action_undo.setEnabled(False)
+        self.action_redo = QAction("重做", self)
+        self.action_redo.setShortcut(QKeySequence.Redo)
+        self.action_redo.setEnabled(False)
+        self.action_roi = QAction("选区处理", self)
+        self.action_roi.setCheckable(True)
+        self.action_roi.setToolTip('拖动鼠标框选区域，只处理选区，再次点击退出')
+        self.action_preview = QAction("预览模式", self)
+        self.action_preview.setCheckable(True)
+        self.action_preview.setChecked(True)
+        self.action_save_pipeline = QAction("保存流程", self)
+        self.action_open_pipeline = QAction("打开流程", self)
+        self.action_batch = QAction("批量处理", self)
+        self.action_thumbnails = QAction("缩略图", self)
+        self.action_thumbnails.setCheckable(True)
+        # 键盘翻页：切换到当前目录中的上一张、下一张图像
+        self.action_prev_image = QAction("上一张", self)
+        self.action_prev_image.setShortcut(QKeySequence.MoveToPreviousPage)
+        self.action_next_image = QAction("下一张", self)
+        self.action_next_image.setShortcut(QKeySequence.MoveToNextPage)
+        self.addActions((self.action_prev_image, self.action_next_image))
+        self.action_profile = QAction("性能分析", self)
+        self.action_profile.setCheckable(True)
+        self.action_export_profile = QAction("导出性能记录", self)
+        self.action_export_video = QAction("导出视频", self)
+        self.action_export_video.setEnabled(False)  # 打开视频后可用
         self.action_right_rotate.triggered.connect(self.right_rotate)
         self.action_left_rotate.triggered.connect(self.left_rotate)
-        self.action_histogram.triggered.connect(self.histogram)
-        self.tool_bar.addActions((self.action_left_rotate, self.action_right_rotate, self.action_histogram))
+        self.action_histogram.toggled.connect(self.histogram)
+        self.action_preview.toggled.connect(self.update_image)
+        self.action_save_pipeline.triggered.connect(self.save_pipeline)
+        self.action_open_pipeline.triggered.connect(self.open_pipeline)
+        self.action_batch.triggered.connect(self.batch_process)
+        self.action_undo.triggered.connect(self.undo)
+        self.action_redo.triggered.connect(self.redo)
+        self.tool_bar.addActions((self.action_undo, self.action_redo,
+                                  self.action_left_rotate, self.action_right_rotate, self.action_histogram,
+                                  self.action_roi, self.action_preview, self.action_save_pipeline, self.action_open_pipeline,
+                                  self.action_batch, self.action_thumbnails, self.action_profile,
+                                  self.action_export_profile, self.action_export_video))
         
         # 初始化自定义组件
         self.useListWidget = UsedListWidget(self)  # 已选操作列表
         self.funcListWidget = FuncListWidget(self)  # 可用操作列表
         self.stackedWidget = StackedWidget(self)    # 参数设置堆栈窗口
         self.fileSystemTreeView = FileSystemTreeView(self)  # 文件系统树视图
-        self.graphicsView = GraphicsView(self)      # 图像显示视图
+        self.graphicsView = GraphicsView(self, DISPLAY_TILE_SIZE, DISPLAY_CACHE_BYTES)  # 图像显示视图
+        self.histogramWidget = HistogramWidget(HISTOGRAM_MAX_SAMPLES, self)  # 直方图面板
         
         # 创建并配置文件目录停靠窗口
         self.dock_file = QDockWidget(self)
@@ -62,41 +122,533 @@ class MyApp(QMainWindow):
         self.dock_attr.setFeatures(QDockWidget.NoDockWidgetFeatures)
         self.dock_attr.close()  # 默认关闭属性窗口
         
+        # 创建并配置直方图停靠窗口，由工具栏的直方图按钮打开和关闭
+        self.dock_hist = QDockWidget(self)
+        self.dock_hist.setWidget(self.histogramWidget)
+        self.dock_hist.setTitleBarWidget(QLabel('直方图'))
+        self.dock_hist.setFeatures(QDockWidget.NoDockWidgetFeatures)
+        self.dock_hist.close()  # 默认关闭直方图窗口
+        
         # 设置中央窗口和停靠窗口布局
         self.setCentralWidget(self.graphicsView)
         self.addDockWidget(Qt.LeftDockWidgetArea, self.dock_file)
         self.addDockWidget(Qt.TopDockWidgetArea, self.dock_func)
         self.addDockWidget(Qt.RightDockWidgetArea, self.dock_used)
         self.addDockWidget(Qt.RightDockWidgetArea, self.dock_attr)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.dock_hist)
         
         # 设置窗口基本属性
         self.setWindowTitle('Opencv图像处理')
         self.setWindowIcon(QIcon('icons/main.png'))
-        self.src_img = None  # 原始图像
+        self.src_img = None  # 原始图像，超大图像首次显示时为按缩小倍数解码的图像
+        self.src_scale = 1.0  # src_img相对原图的缩放比例
+        self.src_path = None  # 原始图像的文件路径
+        self.full_loading = None  # 正在后台加载的原图路径
         self.cur_img = None  # 当前处理后的图像
+        self.cur_scale = 1.0  # 当前结果相对原图的缩放比例，预览时小于1
+        self.cur_key = None  # 当前结果的缓存键(core.pipeline.result_key)
+        self.proxy = None  # 预览用的缩小图: (缩放比例, 图像)
+        self.roi = None  # 只处理的选区，原图像素的范围(y0, y1, x0, x1)
+        self.roi_base = None  # 选区结果下方显示的未处理图像: (原图版本号, 缩放比例)
+        self.src_generation = 0  # 原始图像的版本号，作为逐级缓存的源标识
+        self.batch_worker = None  # 正在进行的批处理
+        self.video = None  # 正在播放的视频(custom.videoWorker.VideoPlayer)
+        self.video_export = None  # 正在进行的视频导出
+        self.video_export_dialog = None  # 视频导出的进度对话框
+        self.video_timer = QTimer(self)  # 播放时定时在状态栏显示各环节的帧率
+        self.video_timer.setInterval(1000)
+        self.video_timer.timeout.connect(self.show_video_stats)
+        self.profiles = deque(maxlen=PROFILE_HISTORY)  # 最近的性能记录，可导出为Chrome trace
+        self.profile_label = QLabel()  # 状态栏中的性能摘要
+        self.statusBar().addPermanentWidget(self.profile_label)
+        self.tile_executor = TileExecutor(TILE_SIZE, TILE_WORKERS, TILE_MIN_PIXELS)  # 大图分块多线程执行
+        self.result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_BYTES)  # 原始分辨率结果的磁盘缓存
+        self.stage_cache = StageCache(STAGE_CACHE_BYTES, self.tile_executor, self.result_cache)  # 逐级结果缓存
+        self.history = EditHistory(HISTORY_BYTES, HISTORY_LENGTH)  # 已选操作的撤销/重做历史
+        self.history.record(dump_pipeline([]))
+        
+        # 后台处理线程，结果通过信号回到界面线程
+        self.worker = PipelineWorker(self.stage_cache, self)
+        self.worker.result_ready.connect(self.show_result)
+        self.worker.failed.connect(self.show_error)
+        self.worker.start()
+        
+        # 后台导出线程，导出依次排队，状态栏显示进度
+        self.export_worker = ExportWorker(self.stage_cache, self.fileSystemTreeView.loader, self)
+        self.export_worker.progress.connect(self.show_export_progress)
+        self.export_worker.exported.connect(self.image_exported)
+        self.export_worker.start()
+        self.export_bar = QProgressBar()
+        self.export_bar.setMaximumWidth(160)
+        self.export_bar.setFormat('导出 %v/%m')
+        self.export_bar.hide()
+        self.statusBar().addPermanentWidget(self.export_bar)
+        
+        # 停止操作后渲染原始分辨率的定时器
+        self.full_res_timer = QTimer(self)
+        self.full_res_timer.setSingleShot(True)
+        self.full_res_timer.setInterval(PREVIEW_IDLE_MS)
+        self.full_res_timer.timeout.connect(self.render_full_resolution)
+        self.full_image_loaded.connect(self.on_full_image_loaded)
+        self.action_profile.toggled.connect(self.toggle_profile)
+        self.action_export_profile.triggered.connect(self.export_profile)
+        self.action_export_video.triggered.connect(self.export_video)
+        self.graphicsView.zoomed.connect(self.on_zoomed)
+        self.action_roi.toggled.connect(self.graphicsView.set_roi_mode)
+        self.graphicsView.roi_changed.connect(self.set_roi)
+        self.action_thumbnails.toggled.connect(self.fileSystemTreeView.set_thumbnails)
+        self.action_prev_image.triggered.connect(lambda: self.fileSystemTreeView.step_image(-1))
+        self.action_next_image.triggered.connect(lambda: self.fileSystemTreeView.step_image(1))
     
     def update_image(self):
-        """更新图像显示，基于当前选择的处理操作链"""
+        """更新图像显示，基于当前选择的处理操作链，在后台线程中处理"""
+        if self.history.record(dump_pipeline(self.used_stages())):
+            self.update_history_actions()
+        if self.video is not None:
+            self.video.set_stages(self.used_stages())  # 从下一帧开始使用新的操作链
+            return
         if self.src_img is None:
             return
-        img = self.process_image()  # 处理图像
-        self.cur_img = img
-        self.graphicsView.update_image(img)  # 更新视图显示
+        self.request_preview()
     
-    def change_image(self, img):
-        """更改当前显示的图像，并重新应用所有处理操作"""
+    def change_image(self, img, scale=1.0, path=None, fit=True):
+        """
+        更改当前显示的图像，并重新应用所有处理操作
+        :param scale: img相对原图的缩放比例，超大图像首次显示时小于1，需要时再加载原图
+        :param path: 图像的文件路径，用于加载原图
+        :param fit: 处理完成后是否适应窗口大小
+        """
+        self.stop_video()
+        self.roi = None  # 选区属于原来的图像
+        self.roi_base = None
+        self.graphicsView.clear_roi()
         self.src_img = img
-        img = self.process_image()
+        self.src_scale = scale
+        self.src_path = path
+        self.src_generation += 1
+        self.proxy = None
+        self.stage_cache.clear()  # 原图已变化，旧的中间结果全部作废
+        self.history.drop_results()
+        self.request_preview(fit=fit)
+    
+    def open_video(self, path):
+        """播放视频，每一帧都经过已选操作处理，修改操作后从下一帧开始生效"""
+        from custom.videoWorker import VideoPlayer
+        try:
+            player = VideoPlayer(path, self.used_stages(), self.tile_executor, VIDEO_QUEUE_SIZE, self)
+        except ValueError as e:
+            self.statusBar().showMessage(str(e), 5000)
+            return
+        self.stop_video()
+        self.full_res_timer.stop()
+        self.src_img = None
+        self.cur_img = None
+        self.cur_key = None
+        self.src_path = path
+        self.video = player
+        self.video.frame_ready.connect(self.show_frame)
+        self.video.failed.connect(self.video_failed)
+        self.video.start()
+        self.video_timer.start()
+        self.action_export_video.setEnabled(True)
+    
+    def stop_video(self):
+        """停止播放视频"""
+        if self.video is None:
+            return
+        self.video_timer.stop()
+        self.video.stop()
+        self.video = None
+        self.action_export_video.setEnabled(False)
+        self.statusBar().clearMessage()
+    
+    def video_failed(self, message):
+        """处理视频帧出错，播放已停止，保留最后显示的一帧"""
+        if self.sender() is not self.video:
+            return
+        self.stop_video()
+        self.statusBar().showMessage('处理视频失败: ' + message, 10000)
+    
+    def show_frame(self, index, img):
+        """显示处理后的一帧，第一帧适应窗口大小"""
+        if self.video is None or self.sender() is not self.video:
+            return  # 已停止播放的视频中残留的帧
+        first = self.cur_img is None or self.cur_img.shape != img.shape
+        self.cur_img = img
+        self.cur_scale = 1.0
+        if first:
+            self.graphicsView.change_image(img)
+        else:
+            self.graphicsView.update_image(img)
+        if self.dock_hist.isVisible():
+            self.histogramWidget.set_image(img)
+        self.video.frame_shown()
+    
+    def show_video_stats(self):
+        """在状态栏显示各环节的帧率和丢弃的帧数"""
+        if self.video is not None:
+            self.statusBar().showMessage('  '.join(map(repr, self.video.meters.values())))
+    
+    def export_video(self):
+        """用已选操作处理视频的每一帧并导出，在后台线程中以最快速度处理，不丢帧"""
+        if self.video is None or self.video_export is not None:
+            return
+        from core.video import FOURCC
+        from custom.videoWorker import VideoExportWorker
+        root, ext = os.path.splitext(self.src_path)
+        if ext.lower() not in FOURCC:
+            ext = '.mp4'  # 没有对应编码的格式改为导出mp4
+        file_name = QFileDialog.getSaveFileName(self, '导出视频', root + '_processed' + ext,
+                                                'Video files(%s)' % ' '.join('*' + e for e in FOURCC))[0]
+        if not file_name:
+            return
+        self.video_export = VideoExportWorker(self.src_path, file_name, self.used_stages(),
+                                              VIDEO_EXPORT_WORKERS, self)
+        dialog = QProgressDialog('导出视频中...', '取消', 0, 0, self)
+        dialog.setWindowTitle('导出视频')
+        dialog.setMinimumDuration(0)
+        self.video_export_dialog = dialog
+        dialog.canceled.connect(self.video_export.cancel)
+        self.video_export.progress.connect(lambda done, total: (dialog.setMaximum(total), dialog.setValue(done)))
+        self.video_export.finished_export.connect(dialog.reset)
+        self.video_export.finished_export.connect(self.video_exported)
+        self.video_export.start()
+    
+    def video_exported(self, meters, error):
+        self.video_export = None
+        self.video_export_dialog.deleteLater()
+        self.video_export_dialog = None
+        if meters is None:
+            self.statusBar().showMessage('导出视频失败: ' + error, 10000)
+        else:
+            self.statusBar().showMessage('导出视频完成  ' + '  '.join(map(repr, meters.values())), 10000)
+    
+    def load_full_resolution(self):
+        """在后台加载原图，完成后替换首次显示的缩小图"""
+        if self.src_scale == 1.0 or self.src_path is None or self.full_loading == self.src_path:
+            return
+        self.full_loading = self.src_path
+        self.statusBar().showMessage('正在加载原始分辨率...')
+        path = self.src_path
+        self.fileSystemTreeView.loader.load_async(path, lambda img: self.full_image_loaded.emit(path, img))
+    
+    def on_full_image_loaded(self, path, img):
+        """原图加载完成，保持当前视图重新处理"""
+        if path == self.full_loading:
+            self.full_loading = None
+            self.statusBar().clearMessage()
+        if img is not None and path == self.src_path and self.src_scale < 1.0:
+            self.change_image(img, 1.0, path, fit=False)
+    
+    def used_stages(self, scale=1.0):
+        """获取已选操作的快照，供后台线程使用"""
+        stages = []
+        for i in range(self.useListWidget.count()):
+            item = self.useListWidget.item(i)
+            item.refresh_state()
+            stages.append(item.snapshot(scale))
+        return stages
+    
+    def preview_scale(self, fit=False):
+        """
+        根据视口大小和缩放级别选择预览比例
+        取不小于所需分辨率的2的负整数次幂，缩放级别小幅变化时可以复用缓存
+        """
+        if not self.action_preview.isChecked():
+            return 1.0
+        h, w = (n / self.src_scale for n in self.src_img.shape[:2])  # 原图尺寸
+        if fit or not self.graphicsView.has_photo():
+            needed = self.graphicsView.fit_scale(w, h)
+        else:
+            needed = self.graphicsView.view_scale()
+        if needed <= 0:
+            return 1.0
+        scale = 2.0 ** math.ceil(math.log2(needed))
+        return scale if scale <= PREVIEW_MAX_SCALE else 1.0
+    
+    def proxy_image(self, scale):
+        """获取按scale缩小的原图，同一比例只缩放一次"""
+        if scale == self.src_scale:
+            return self.src_img
+        if self.proxy is None or self.proxy[0] != scale:
+            h, w = self.src_img.shape[:2]
+            ratio = scale / self.src_scale
+            size = (max(1, int(round(w * ratio))), max(1, int(round(h * ratio))))
+            self.proxy = (scale, cv2.resize(self.src_img, size, interpolation=cv2.INTER_AREA))
+        return self.proxy[1]
+    
+    def request_preview(self, fit=False):
+        """提交预览请求，并在停止操作一段时间后渲染原始分辨率(已是原始分辨率时只写入磁盘缓存)"""
+        self.request_process(fit, self.preview_scale(fit))
+        self.full_res_timer.start()
+    
+    def request_process(self, fit=False, scale=1.0):
+        """
+        向后台线程提交处理请求，未处理的旧请求会被丢弃
+        需要的分辨率超过首次显示的缩小图时开始加载原图，加载完成前先处理缩小图
+        """
+        if scale > self.src_scale:
+            self.load_full_resolution()
+            scale = self.src_scale
+        src = self.proxy_image(scale)
+        # 只有原始分辨率的完整原图才读取磁盘结果缓存
+        path = self.src_path if scale == 1.0 else None
+        self.worker.submit(src, (self.src_generation, scale), self.used_stages(scale), fit, scale,
+                           self.action_profile.isChecked(), path, self.roi_at(scale, src.shape))
+    
+    def set_roi(self, roi):
+        """选区改变后重新处理，roi为None时恢复处理整幅图像"""
+        self.roi = roi
+        if roi is None:
+            self.roi_base = None
+        self.update_image()
+    
+    def roi_at(self, scale, shape):
+        """选区在按scale缩小的图像中的范围，没有选区时返回None"""
+        if self.roi is None:
+            return None
+        y0, y1, x0, x1 = self.roi
+        h, w = shape[:2]
+        y0, x0 = min(int(y0 * scale), h - 1), min(int(x0 * scale), w - 1)
+        return y0, max(y0 + 1, min(h, math.ceil(y1 * scale))), x0, max(x0 + 1, min(w, math.ceil(x1 * scale)))
+    
+    def show_result(self, seq, img, fit, scale, profile=None, key=None, roi=None):
+        """
+        后台处理完成，显示最新结果，结果对应当前的操作链时附带到当前的历史记录
+        :param roi: 只处理了选区时为选区在结果图像中的范围，img是选区贴回未处理图像后的整幅图像，
+                    显示时只把选区叠加在未处理的图像上，不必重新转换整幅图像
+        """
+        if self.video is not None:
+            return  # 打开视频前提交的图像请求
         self.cur_img = img
-        self.graphicsView.change_image(img)  # 更新视图并适应窗口大小
+        self.cur_scale = scale
+        self.cur_key = key
+        start = time.perf_counter()
+        if roi is not None:
+            if self.roi_base != (self.src_generation, scale):
+                self.graphicsView.update_image(self.proxy_image(scale), scale)
+                self.roi_base = (self.src_generation, scale)
+            y0, y1, x0, x1 = roi
+            self.graphicsView.show_region(img[y0:y1, x0:x1], roi)
+            if fit:
+                self.graphicsView.fitInView()
+        else:
+            self.roi_base = None
+            self.graphicsView.hide_region()
+            if self.roi is not None:
+                self.statusBar().showMessage('操作链中有依赖全图的操作，已处理整幅图像', 5000)
+            if fit:
+                self.graphicsView.change_image(img, scale)  # 更新视图并适应窗口大小
+            else:
+                self.graphicsView.update_image(img, scale)  # 更新视图显示
+        if profile is not None:
+            # 立即重绘，使显示转换计入本次记录
+            self.graphicsView.viewport().repaint()
+            profile.set_display(start, time.perf_counter() - start)
+            self.show_profile(profile)
+        if self.dock_hist.isVisible():
+            self.histogramWidget.set_image(img)
+        if key is not None and key == result_key((self.src_generation, scale), self.used_stages(scale)):
+            self.history.attach(key, img, scale)
+        if scale == 1.0 and not self.full_res_timer.isActive():
+            self.persist_result()  # 停止编辑后才到达的原始分辨率结果
+    
+    def undo(self):
+        """撤销对已选操作的上一次修改"""
+        self.stackedWidget.flush()  # 先提交未提交的参数修改，使它也能被撤销
+        entry = self.history.undo()
+        if entry is not None:
+            self.restore_history(entry)
+    
+    def redo(self):
+        """重做被撤销的修改"""
+        self.stackedWidget.flush()
+        entry = self.history.redo()
+        if entry is not None:
+            self.restore_history(entry)
+    
+    def restore_history(self, entry):
+        """
+        恢复历史记录中的操作链
+        记录附带的处理结果仍然有效时放回逐级缓存，随后的处理请求直接命中；
+        没有选区时立即显示，有选区时记录的整图结果与选区的显示不符，等待选区重新处理
+        """
+        stages = build_pipeline(entry.pipeline)
+        if entry.result is not None and self.src_img is not None and self.video is None:
+            key, img, scale = entry.result
+            if key == result_key((self.src_generation, scale), [stage.copy(scale) for stage in stages]):
+                self.stage_cache.put(key, img)
+                if self.roi is None:
+                    self.cur_img = img
+                    self.cur_scale = scale
+                    self.cur_key = key
+                    self.graphicsView.update_image(img, scale)
+        # 中间结果可能被重做复用，不清除
+        self.useListWidget.set_stages(stages, invalidate=False)
+        self.update_history_actions()
     
-    def process_image(self):
-        """根据已选操作列表处理图像"""
-        img = self.src_img.copy()  # 复制原始图像，避免修改原图
-        # 遍历所有已选操作并依次应用
+    def update_history_actions(self):
+        self.action_undo.setEnabled(self.history.can_undo())
+        self.action_redo.setEnabled(self.history.can_redo())
+    
+    def on_zoomed(self):
+        """放大后预览分辨率可能不足，停止操作后渲染原始分辨率"""
+        if self.cur_scale < 1.0:
+            self.full_res_timer.start()
+    
+    def render_full_resolution(self):
+        """
+        停止操作后渲染原始分辨率，首次显示的缩小图已满足当前视图时不加载原图
+        当前结果已是原始分辨率时不再处理，只写入磁盘结果缓存
+        """
+        if self.src_img is None:
+            return
+        if self.cur_scale == 1.0:
+            self.persist_result()
+            return
+        if self.src_scale < 1.0 and self.preview_scale() <= self.src_scale:
+            return
+        self.request_process()
+    
+    def persist_result(self):
+        """
+        当前结果是原图经当前操作链的完整结果时，在后台写入磁盘结果缓存
+        只在停止编辑后调用，交互编辑中的结果和选区的结果不写入
+        """
+        if self.src_path is None or self.src_scale < 1.0 or self.cur_scale < 1.0:
+            return
+        stages = self.used_stages()
+        if stages and self.cur_key == result_key((self.src_generation, 1.0), stages):
+            self.result_cache.put_async(self.src_path, stages, self.cur_img)
+    
+    def show_error(self, seq, message):
+        """后台处理出错时在状态栏提示"""
+        self.statusBar().showMessage('处理失败: ' + message, 5000)
+    
+    def show_profile(self, profile):
+        """在已选操作列表中显示各级的耗时，在状态栏显示总耗时"""
+        self.profiles.append(profile)
+        count = self.useListWidget.count()
+        for i, record in enumerate(profile.per_stage(count)):
+            self.useListWidget.item(i).set_timing(record)
+        text = '处理 %.1fms' % (profile.seconds * 1000)
+        if profile.display_seconds is not None:
+            text += '  显示 %.1fms  合计 %.1fms' % (profile.display_seconds * 1000,
+                                                (profile.seconds + profile.display_seconds) * 1000)
+        if profile.scale < 1.0:
+            text += '  (预览 1/%g)' % (1 / profile.scale)
+        self.profile_label.setText(text)
+    
+    def toggle_profile(self, checked):
+        """打开时重新处理一次以得到记录，关闭时清除显示的耗时"""
+        if checked:
+            self.update_image()
+            return
         for i in range(self.useListWidget.count()):
-            img = self.useListWidget.item(i)(img)
-        return img
+            self.useListWidget.item(i).set_timing(None)
+        self.profile_label.clear()
+    
+    def export_profile(self):
+        """把最近的性能记录导出为Chrome trace(JSON)，可在chrome://tracing或Perfetto中查看"""
+        if not self.profiles:
+            QMessageBox.information(self, '导出性能记录', '没有性能记录，请先打开性能分析')
+            return
+        file_name = QFileDialog.getSaveFileName(self, '导出性能记录', './trace.json', 'Trace files(*.json)')[0]
+        if file_name:
+            save_chrome_trace(file_name, list(self.profiles))
+    
+    def export_image(self, file_name, params=None):
+        """
+        在后台导出原始分辨率的处理结果，立即返回，可以继续编辑
+        导出使用提交时的图像和操作链，之后的修改不影响本次导出
+        :param params: 编码参数(core.imageio.encode_params)
+        """
+        if self.video is not None:
+            # 视频导出当前显示的帧
+            job = ExportJob(self.cur_img, 1.0, None, None, [], file_name, params)
+        elif self.src_img is not None:
+            job = ExportJob(self.src_img, self.src_scale, self.src_path, self.src_generation,
+                            self.used_stages(), file_name, params)
+        else:
+            return
+        self.export_worker.submit(job)
+    
+    def show_export_progress(self, done, submitted, file_name):
+        """在状态栏显示导出队列的进度，全部完成后隐藏"""
+        self.export_bar.setRange(0, submitted)
+        self.export_bar.setValue(done)
+        self.export_bar.setToolTip(file_name)
+        self.export_bar.setVisible(done < submitted)
+    
+    def image_exported(self, file_name, error):
+        if error:
+            self.statusBar().showMessage('导出失败 %s: %s' % (file_name, error), 10000)
+        else:
+            self.statusBar().showMessage('已导出 ' + file_name, 5000)
+    
+    def save_pipeline(self):
+        """把已选操作保存为JSON文件，可由命令行(cli.py)批量应用"""
+        file_name = QFileDialog.getSaveFileName(self, '保存流程', './', 'Pipeline files(*.json)')[0]
+        if file_name:
+            save_pipeline(file_name, self.used_stages())
+    
+    def open_pipeline(self):
+        """打开保存的处理流程，替换已选操作"""
+        file_name = QFileDialog.getOpenFileName(self, '打开流程', './', 'Pipeline files(*.json)')[0]
+        if not file_name:
+            return
+        try:
+            stages = load_pipeline(file_name)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, '打开流程', '无法读取处理流程: %s' % e)
+            return
+        self.useListWidget.set_stages(stages)
+    
+    def batch_process(self):
+        """用已选操作批量处理一个目录中的图像，在后台多进程处理"""
+        if self.batch_worker is not None:
+            return
+        src_dir = QFileDialog.getExistingDirectory(self, '选择输入目录', './')
+        if not src_dir:
+            return
+        dst_dir = QFileDialog.getExistingDirectory(self, '选择输出目录', './')
+        if not dst_dir:
+            return
+        if os.path.realpath(src_dir) == os.path.realpath(dst_dir):
+            QMessageBox.warning(self, '批量处理', '输出目录不能与输入目录相同')
+            return
+        jobs = [(os.path.join(src_dir, name), os.path.join(dst_dir, name))
+                for name in sorted(os.listdir(src_dir)) if is_image_file(name)]
+        if not jobs:
+            return
+        resume = True
+        if any(os.path.exists(dst) for _, dst in jobs):
+            # 输出目录中已有同名文件：默认只跳过由同一流程生成的，也可以全部覆盖
+            box = QMessageBox(QMessageBox.Question, '批量处理', '输出目录中已有同名文件',
+                              QMessageBox.Cancel, self)
+            box.setInformativeText('跳过已由当前流程生成的文件，还是全部重新处理并覆盖？')
+            skip_button = box.addButton('跳过已完成的', QMessageBox.AcceptRole)
+            box.addButton('全部覆盖', QMessageBox.DestructiveRole)
+            box.setDefaultButton(skip_button)
+            box.exec()
+            if box.clickedButton() is box.button(QMessageBox.Cancel):
+                return
+            resume = box.clickedButton() is skip_button
+        from custom.batchWorker import BatchWorker  # 多进程批处理模块较重，用到时才导入
+        self.batch_worker = BatchWorker(dump_pipeline(self.used_stages()), jobs, cache_dir=RESULT_CACHE_DIR,
+                                        cache_bytes=RESULT_CACHE_BYTES, resume=resume, parent=self)
+        dialog = QProgressDialog('批量处理中...', '取消', 0, len(jobs), self)
+        dialog.setWindowTitle('批量处理')
+        dialog.setMinimumDuration(0)
+        dialog.canceled.connect(self.batch_worker.cancel)
+        self.batch_worker.progress.connect(lambda done, total, name: dialog.setValue(done))
+        self.batch_worker.finished_batch.connect(dialog.reset)
+        self.batch_worker.finished_batch.connect(self.batch_finished)
+        self.batch_worker.start()
+    
+    def batch_finished(self, done, skipped, failed):
+        self.batch_worker = None
+        self.statusBar().showMessage('批量处理完成 %d, 跳过 %d, 失败 %d' % (done, skipped, failed), 10000)
     
     def right_rotate(self):
         """将图像向右旋转90度"""
@@ -106,23 +658,58 @@ class MyApp(QMainWindow):
         """将图像向左旋转90度"""
         self.graphicsView.rotate(-90)
     
-    def histogram(self):
-        """显示当前图像的直方图"""
-        color = ('b', 'g', 'r')
-        # 分别计算并绘制BGR三个通道的直方图
-        for i, col in enumerate(color):
-            histr = cv2.calcHist([self.cur_img], [i], None, [256], [0, 256])
-            histr = histr.flatten()  # 将直方图数据展平
-            plt.plot(range(256), histr, color=col)  # 绘制直方图曲线
-            plt.xlim([0, 256])  # 设置x轴范围
-        plt.show()  # 显示图表
+    def histogram(self, checked):
+        """打开或关闭直方图面板，打开后每次处理完成都会更新"""
+        self.dock_hist.setVisible(checked)
+        if checked:
+            self.histogramWidget.set_image(self.cur_img)
+    
+    def closeEvent(self, event):
+        """关闭窗口前结束后台处理线程"""
+        self.worker.stop()
+        self.export_worker.stop()  # 等待排队的导出完成
+        self.stop_video()
+        if self.video_export is not None:
+            self.video_export.cancel()
+            self.video_export.wait()
+        if self.batch_worker is not None:
+            self.batch_worker.cancel()
+            self.batch_worker.wait()
+        self.tile_executor.shutdown()
+        self.fileSystemTreeView.fileSystemModel.shutdown()
+        self.fileSystemTreeView.loader.shutdown()
+        super(MyApp, self).closeEvent(event)
+
+
+class StartupTimer(QObject):
+    """
+    启动耗时测量(benchmarks/bench_startup.py)：设置环境变量STARTUP_TIMING后，
+    窗口第一次绘制时输出导入耗时和首次绘制耗时(秒)并退出
+    """
+
+    def __init__(self, window, import_done):
+        super(StartupTimer, self).__init__(window)
+        self.import_done = import_done
+        self.window = window
+        window.graphicsView.viewport().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            print('STARTUP import=%.4f first_paint=%.4f' % (self.import_done - START_TIME,
+                                                            time.perf_counter() - START_TIME), flush=True)
+            QTimer.singleShot(0, self.window.close)
+        return False
 
 
 if __name__ == "__main__":
     """应用程序入口点"""
+    import_done = time.perf_counter()
     app = QApplication(sys.argv)
     # 加载样式表
     app.setStyleSheet(open('custom/styleSheet.qss', encoding='utf-8').read())
     window = MyApp()  # 创建主窗口
+    if os.environ.get('STARTUP_TIMING'):
+        timer = StartupTimer(window, import_done)
     window.show()  # 显示窗口
     sys.exit(app.exec_())  # 进入应用程序主循环
@@ -0,0 +1,29 @@
+import struct
+
+import cv2
+import numpy as np
+
+from core.imageio import read_image, read_reduced
+
+
+def exif_rotated_jpeg(path, img, orientation=6):
+    """写入带EXIF方向标签的JPEG(方向6: 显示时顺时针旋转90度)"""
+    ok, buf = cv2.imencode('.jpg', img)
+    assert ok
+    ifd = struct.pack('<2sHI', b'II', 42, 8) + struct.pack('<HHHIHHI', 1, 0x0112, 3, 1, orientation, 0, 0)
+    payload = b'Exif\x00\x00' + ifd
+    app1 = b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+    data = buf.tobytes()
+    with open(path, 'wb') as f:
+        f.write(data[:2] + app1 + data[2:])
+
+
+def test_reduced_ignores_exif_orientation(tmp_path):
+    path = str(tmp_path / 'rotated.jpg')
+    exif_rotated_jpeg(path, np.full((400, 1200, 3), 128, np.uint8))
+    assert cv2.imread(path).shape[:2] == (1200, 400)  # 确认文件确实带有方向标签
+    full = read_image(path)
+    for min_side in (100, 300, 600, 2000):
+        img, factor = read_reduced(path, min_side)
+        h, w = full.shape[:2]
+        assert img.shape == (-(-h // factor), -(-w // factor), 3)
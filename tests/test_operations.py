@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+
+from flags import GAUSSIAN_FILTER
+from core.operations import Filter
+
+
+def shrink(img, scale):
+    h, w = img.shape[:2]
+    return cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def test_gaussian_sigma_scaled_on_proxy():
+    """缩小图上的预览与原图处理后再缩小的结果一致，显式给出的标准差随比例缩放"""
+    rng = np.random.default_rng(0)
+    img = cv2.resize(rng.integers(0, 256, (60, 80, 3), dtype=np.uint8), (1600, 1200),
+                     interpolation=cv2.INTER_NEAREST)
+    op = Filter()
+    op.update_params({'kind': GAUSSIAN_FILTER, 'ksize': 61, 'sigmax': 10.0})
+    scale = 0.25
+    proxy = op.copy(scale)
+    assert proxy.get_params()['sigmax'] == 2.5
+    expected = shrink(op(img), scale).astype(np.float32)
+    preview = proxy(shrink(img, scale)).astype(np.float32)
+    unscaled = Filter()
+    unscaled.update_params(dict(proxy.get_params(), sigmax=10.0))
+    wrong = unscaled(shrink(img, scale)).astype(np.float32)
+    error = np.abs(preview - expected).mean()
+    assert error < 2.0
+    assert error < np.abs(wrong - expected).mean() / 2
+
+
+def test_auto_sigma_not_scaled():
+    op = Filter()
+    op.update_params({'kind': GAUSSIAN_FILTER, 'ksize': 9, 'sigmax': 0})
+    assert op.copy(0.5).get_params()['sigmax'] == 0
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+
+from core.operations import Operation
+from core.video import VideoStream
+
+
+class Failing(Operation):
+    """处理任何一帧都出错的操作"""
+
+    def process(self, img):
+        raise ValueError('bad frame')
+
+
+def write_video(path, frames=10):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 20, np.uint8))
+    writer.release()
+
+
+def test_failing_stage_ends_stream_with_error(tmp_path):
+    path = str(tmp_path / 'in.avi')
+    write_video(path)
+    errors, frames = [], []
+    stream = VideoStream(path, [Failing()], lambda index, img: frames.append(index), loop=True,
+                         on_error=errors.append)
+    stream.start()
+    assert stream.finished.wait(5), '处理出错后播放没有结束'
+    stream.stop()
+    assert not any(thread.is_alive() for thread in stream._threads)
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)
+    assert stream.error is errors[0]
+    assert frames == []